@@ -0,0 +1,265 @@
+"""CSC111 Course Project: anime_catalog.py
+
+Module description
+===============================
+
+This Python module is responsible for keeping the anime catalog and the keyword graph in memory between queries.
+The first query of a process loads the animes of recommendation_algorithm.ANIME_FILE as CompactMedia objects and the
+compact keyword graph (with a keyword pair cache), and every later query reuses them. Before each query, the files
+they were loaded from are checked, first by modification time and size and then by a hash of their contents. If one
+of them has really changed, a new catalog is built in the background and swapped in when it is ready, so that a
+long-running process picks up regenerated datasets without being restarted or pausing its queries.
+
+This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
+"""
+from __future__ import annotations
+from typing import Optional
+import hashlib
+import json
+import os
+import threading
+
+import graph_classes
+import recommendation_algorithm
+from recommendation_algorithm import CompactMedia
+
+# Maps each file hashed by file_digest to its (modification time, size) when it was hashed, and its hash.
+_FILE_DIGESTS = {}
+
+
+class AnimeCatalog:
+    """The animes that can be recommended and the keyword graph they are compared with.
+
+    Instance Attributes:
+        - media: the CompactMedia of every anime in recommendation_algorithm.ANIME_FILE, in the order of the file
+        - genre_masks: the genre mask of every anime, in the same order
+        - ratings: the rating of every anime, in the same order
+        - graph: the compact keyword graph, with a graph_classes.KeywordPairCache shared by every query
+        - digests: maps each file the catalog was loaded from to the hash of its contents when it was loaded (see
+          current_digests)
+
+    Representation Invariants:
+        - len(self.media) == len(self.genre_masks) == len(self.ratings)
+    """
+    media: list[CompactMedia]
+    genre_masks: list[int]
+    ratings: list[float]
+    graph: graph_classes.CompactGraph
+    digests: dict[str, Optional[str]]
+
+    def __init__(self) -> None:
+        """Load the catalog from the anime dataset and keyword graph files.
+        """
+        # Hashed before reading, so that a file changed while it is read makes the catalog stale.
+        self.digests = current_digests()
+        with open(recommendation_algorithm.ANIME_FILE, 'r') as file:
+            entries = json.load(file)
+        synopses = []
+        self.media = [CompactMedia(entry, 'anime', synopses) for entry in entries]
+        self.genre_masks = [anime.genre_mask for anime in self.media]
+        self.ratings = [anime.rating for anime in self.media]
+        self.graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True)
+        self.graph.pair_cache = graph_classes.KeywordPairCache()
+
+    def __len__(self) -> int:
+        """Return the number of animes in the catalog."""
+        return len(self.media)
+
+    def filtered(self, min_rating: float, genres: set[str], start: int = 0,
+                 stop: Optional[int] = None) -> list[CompactMedia]:
+        """Return the animes at positions start to stop (exclusive, or to the end if stop is None) of the catalog
+        that are rated at least min_rating and have every genre in genres, in catalog order.
+
+        The animes are picked out by their positions, without copying or changing self.media.
+        """
+        whitelist_mask = recommendation_algorithm.GENRE_VOCABULARY.lookup_mask(genres)
+        if whitelist_mask is None:  # Some whitelisted genre is not the genre of any anime
+            return []
+        stop = len(self.media) if stop is None else min(stop, len(self.media))
+        return [self.media[i] for i in range(start, stop)
+                if self.ratings[i] >= min_rating and self.genre_masks[i] & whitelist_mask == whitelist_mask]
+
+    def is_stale(self) -> bool:
+        """Return whether any file the catalog was loaded from has changed since, or the catalog is now set to be
+        loaded from other files.
+        """
+        return current_digests() != self.digests
+
+
+class CatalogHolder:
+    """Holds the catalog shared by every query in this process, loading it on first use and reloading it whenever the
+    files it was loaded from change.
+
+    A reload builds the new catalog in a background thread while queries keep getting the current one, then swaps it
+    in by replacing a single reference. Queries that already hold the old catalog finish on it, and it is freed
+    once the last of them lets it go. If the new catalog cannot be built (for example, because a file is still being
+    written), the current one is kept, and the files are only tried again once they change again.
+
+    >>> import tempfile
+    >>> files = (recommendation_algorithm.ANIME_FILE, recommendation_algorithm.KEYWORD_GRAPH_FILE,
+    ...          recommendation_algorithm.KEYWORD_GRAPH_SNAPSHOT)
+    >>> directory = tempfile.mkdtemp()
+    >>> recommendation_algorithm.ANIME_FILE = os.path.join(directory, 'animes.json')
+    >>> recommendation_algorithm.KEYWORD_GRAPH_FILE = os.path.join(directory, 'keyword_graph.txt')
+    >>> recommendation_algorithm.KEYWORD_GRAPH_SNAPSHOT = os.path.join(directory, 'keyword_graph.bin')
+    >>> with open(recommendation_algorithm.ANIME_FILE, 'w') as file:
+    ...     _ = file.write('[]')
+    >>> with open(recommendation_algorithm.KEYWORD_GRAPH_FILE, 'w') as file:
+    ...     _ = file.write("{'ninja', 'samurai'}\\n{('ninja', 'samurai')}")
+    >>> holder = CatalogHolder()
+    >>> catalog = holder.get()
+    >>> with open(recommendation_algorithm.KEYWORD_GRAPH_FILE, 'w') as file:  # Only the keywords are written yet
+    ...     _ = file.write("{'ninja', 'samurai', 'sword'}\\n")
+    >>> holder.reload().join()
+    >>> holder.reloads, type(holder.last_error).__name__, holder.is_reloading(), holder.get() is catalog
+    (0, 'IndexError', False, True)
+    >>> holder.is_reloading()  # The files have not changed since the reload failed
+    False
+    >>> with open(recommendation_algorithm.KEYWORD_GRAPH_FILE, 'a') as file:  # And now the edges
+    ...     _ = file.write("{('ninja', 'sword')}")
+    >>> holder.reload().join()
+    >>> holder.reloads, holder.get() is catalog
+    (1, False)
+    >>> (recommendation_algorithm.ANIME_FILE, recommendation_algorithm.KEYWORD_GRAPH_FILE,
+    ...  recommendation_algorithm.KEYWORD_GRAPH_SNAPSHOT) = files
+
+    Instance Attributes:
+        - reloads: the number of catalogs swapped in by reloads
+        - last_error: the error raised by the last reload that failed, or None if none has
+        - _catalog: the current catalog, or None if none has been loaded yet
+        - _lock: held while the first catalog is loaded and while a reload is started or finished
+        - _reloading: the thread building the next catalog, or None if no reload is under way
+        - _failed_digests: the digests (see current_digests) of the files the last failed reload was built from, or
+          None if the last reload did not fail
+    """
+    reloads: int
+    last_error: Optional[Exception]
+    _catalog: Optional[AnimeCatalog]
+    _lock: threading.Lock
+    _reloading: Optional[threading.Thread]
+    _failed_digests: Optional[dict[str, Optional[str]]]
+
+    def __init__(self) -> None:
+        """Initialize a holder that has not loaded a catalog yet."""
+        self.reloads = 0
+        self.last_error = None
+        self._catalog = None
+        self._lock = threading.Lock()
+        self._reloading = None
+        self._failed_digests = None
+
+    def get(self) -> AnimeCatalog:
+        """Return the current catalog. The first call loads it, and a call that finds it stale starts a reload
+        (see CatalogHolder.reload) but still returns the current catalog.
+        """
+        catalog = self._catalog
+        if catalog is None:
+            with self._lock:
+                if self._catalog is None:  # Otherwise another thread has just loaded it
+                    self._catalog = AnimeCatalog()
+                return self._catalog
+        digests = current_digests()
+        if digests != catalog.digests and digests != self._failed_digests:
+            self.reload()
+        return catalog
+
+    def reload(self) -> threading.Thread:
+        """Start building a new catalog from the current files in a background thread, unless one is already being
+        built, and return the thread building it. The new catalog is swapped in once it is built.
+        """
+        with self._lock:
+            if self._reloading is None:
+                self._reloading = threading.Thread(target=self._build, name='catalog-reload', daemon=True)
+                self._reloading.start()
+            return self._reloading
+
+    def is_reloading(self) -> bool:
+        """Return whether a reload is under way."""
+        return self._reloading is not None
+
+    def peek(self) -> Optional[AnimeCatalog]:
+        """Return the current catalog without loading or checking it, or None if none has been loaded yet.
+        """
+        return self._catalog
+
+    def _build(self) -> None:
+        """Build a new catalog and swap it in, or record why it could not be built. This runs in the reload thread.
+        """
+        digests = current_digests()
+        try:
+            catalog = AnimeCatalog()
+        except Exception as error:
+            # A missing or malformed file can raise almost anything while it is parsed (for example, an IndexError
+            # when keyword_graph_maker has only written the first line of the keyword graph file), and whatever it
+            # is must not end the reload thread without recording it.
+            with self._lock:
+                self.last_error = error
+                self._failed_digests = digests
+            return
+        else:
+            with self._lock:
+                self._catalog = catalog
+                self.reloads += 1
+                self._failed_digests = None
+        finally:
+            with self._lock:
+                self._reloading = None
+
+
+# The catalog holder shared by every query in this process.
+SHARED_CATALOG = CatalogHolder()
+
+
+def get_catalog() -> AnimeCatalog:
+    """Return the anime catalog shared by every query in this process (see CatalogHolder.get).
+    """
+    return SHARED_CATALOG.get()
+
+
+def current_digests() -> dict[str, Optional[str]]:
+    """Return a mapping from the name of each file the catalog is loaded from to the hash of its contents (see
+    file_digest), or None if it does not exist.
+
+    These are the anime dataset, the keyword graph file and its binary snapshot, as the keyword graph is loaded from
+    the snapshot whenever that is the newer of the two (see recommendation_algorithm.build_keyword_graph_from_file).
+    """
+    digests = {}
+    for filename in (recommendation_algorithm.ANIME_FILE, recommendation_algorithm.KEYWORD_GRAPH_FILE,
+                     recommendation_algorithm.KEYWORD_GRAPH_SNAPSHOT):
+        try:
+            digests[filename] = file_digest(filename)
+        except FileNotFoundError:
+            digests[filename] = None
+    return digests
+
+
+def file_digest(filename: str) -> str:
+    """Return the SHA-256 hash of the contents of filename. The hash is only recomputed when the modification time or
+    size of the file has changed since it was last hashed by this process.
+    """
+    stat = os.stat(filename)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if filename not in _FILE_DIGESTS or _FILE_DIGESTS[filename][0] != signature:
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _FILE_DIGESTS[filename] = (signature, digest.hexdigest())
+    return _FILE_DIGESTS[filename][1]
+
+
+if __name__ == '__main__':
+    # Enabling doctest checking features:
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    # Enabling python_ta configurations:
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'hashlib', 'json', 'os', 'threading', 'graph_classes', 'recommendation_algorithm'],
+        'allowed-io': ['AnimeCatalog.__init__', 'file_digest'],
+        'disable': ['W0718'],
+        'max-line-length': 120,
+    })
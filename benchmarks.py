@@ -0,0 +1,484 @@
+"""CSC111 Course Project: benchmarks.py
+
+Module description
+===============================
+
+This Python module is responsible for measuring the performance of our keyword graph and recommendation code.
+Each benchmark function prints its results to the console, and running this file runs every benchmark.
+All benchmarks use the real datasets in datasets/filtered, so they must be run from the top level of the project.
+
+This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
+"""
+from __future__ import annotations
+
+import ast
+import json
+import random
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+import anime_catalog
+import graph_classes
+import recommendation_algorithm
+import scoring_engine
+from recommendation_algorithm import Media
+
+
+def read_keyword_graph_file() -> tuple[set[str], set[tuple[str, str]]]:
+    """Return the set of vertices and the set of edges stored in datasets/filtered/keyword_graph.txt.
+    """
+    with open('datasets/filtered/keyword_graph.txt', 'r') as f:
+        lines = f.readlines()
+    return ast.literal_eval(lines[0]), ast.literal_eval(lines[1])
+
+
+def build_graph(graph_class: Callable[[], graph_classes.Graph | graph_classes.CompactGraph],
+                vertices: set[str], edges: set[tuple[str, str]]) \
+        -> graph_classes.Graph | graph_classes.CompactGraph:
+    """Return a graph of type graph_class with the given vertices and edges.
+    """
+    graph = graph_class()
+    for vertex in vertices:
+        graph.add_vertex(vertex)
+    graph.add_all_edges(edges)
+    # Make sure lazily built structures (such as the CSR arrays of CompactGraph) are counted in memory benchmarks.
+    graph.num_edges()
+    return graph
+
+
+def benchmark_graph_memory() -> dict[str, int]:
+    """Print and return the number of bytes allocated to build the keyword graph with each graph class.
+    """
+    vertices, edges = read_keyword_graph_file()
+    results = {}
+    for graph_class in (graph_classes.Graph, graph_classes.CompactGraph):
+        # Build once untraced so that one-off costs such as lazily imported modules are not counted.
+        build_graph(graph_class, vertices, edges)
+        tracemalloc.start()
+        graph = build_graph(graph_class, vertices, edges)
+        results[graph_class.__name__], _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del graph
+
+    for name, size in results.items():
+        print(f'{name}: {size / 1024:.1f} KiB ({size / len(edges):.1f} bytes per edge)')
+    return results
+
+
+def benchmark_graph_lookup(num_pairs: int = 2000, seed: int = 111) -> dict[str, tuple[float, float, float]]:
+    """Print and return the average time in microseconds of adjacent, shortest_path and distance on num_pairs random
+    pairs of keywords, for each graph class.
+    """
+    vertices, edges = read_keyword_graph_file()
+    rng = random.Random(seed)
+    words = sorted(vertices)
+    pairs = [(rng.choice(words), rng.choice(words)) for _ in range(num_pairs)]
+
+    results = {}
+    for graph_class in (graph_classes.Graph, graph_classes.CompactGraph):
+        graph = build_graph(graph_class, vertices, edges)
+
+        start = time.perf_counter()
+        for word1, word2 in pairs:
+            graph.adjacent(word1, word2)
+        adjacent_time = (time.perf_counter() - start) / num_pairs * 1e6
+
+        start = time.perf_counter()
+        for word1, word2 in pairs:
+            graph.shortest_path(word1, word2)
+        path_time = (time.perf_counter() - start) / num_pairs * 1e6
+
+        start = time.perf_counter()
+        for word1, word2 in pairs:
+            graph.distance(word1, word2)
+        distance_time = (time.perf_counter() - start) / num_pairs * 1e6
+
+        results[graph_class.__name__] = (adjacent_time, path_time, distance_time)
+
+    for name, (adjacent_time, path_time, distance_time) in results.items():
+        print(f'{name}: adjacent {adjacent_time:.2f} us, shortest_path {path_time:.2f} us, '
+              f'distance {distance_time:.2f} us')
+    return results
+
+
+def benchmark_graph_loading() -> dict[str, float]:
+    """Print and return the time in milliseconds taken to load the keyword graph by parsing keyword_graph.txt
+    and by memory-mapping a binary snapshot of it.
+    """
+    results = {}
+    start = time.perf_counter()
+    vertices, edges = read_keyword_graph_file()
+    graph = build_graph(graph_classes.CompactGraph, vertices, edges)
+    results['text'] = (time.perf_counter() - start) * 1e3
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_file = os.path.join(directory, 'keyword_graph.bin')
+        graph.write_snapshot(snapshot_file)
+        start = time.perf_counter()
+        graph_classes.CompactGraph.from_snapshot(snapshot_file)
+        results['snapshot'] = (time.perf_counter() - start) * 1e3
+
+    for name, load_time in results.items():
+        print(f'Loading the keyword graph from {name}: {load_time:.2f} ms')
+    return results
+
+
+def sample_media(num_animes: int, num_inputs: int, seed: int = 111) -> tuple[list[Media], list[Media]]:
+    """Return num_animes random animes from final_animes.json and num_inputs random movies from
+    final_imdb_movies.json, as Media objects.
+    """
+    rng = random.Random(seed)
+    with open('datasets/filtered/final_animes.json', 'r') as f:
+        animes = rng.sample(json.load(f), num_animes)
+    with open('datasets/filtered/final_imdb_movies.json', 'r') as f:
+        movies = rng.sample(json.load(f), num_inputs)
+    return [Media(entry, 'anime') for entry in animes], [Media(entry, 'movie') for entry in movies]
+
+
+def benchmark_depth_caps(caps: tuple[Optional[int], ...] = (1, 2, 3, 4, 6, None), num_animes: int = 100,
+                         num_inputs: int = 3) -> dict[Optional[int], tuple[float, float, float, float]]:
+    """Print the eccentricity statistics of the keyword graph, then print and return, for each depth cap in caps,
+    the mean and maximum loss in keyword score (compared to uncapped scoring) and the median and 99th percentile
+    time in milliseconds of Media.keyword_comparison over random anime and movie pairs.
+    """
+    graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True)
+    # Isolated keywords have eccentricity 0, so they are left out of the statistics.
+    eccentricities = sorted(graph.eccentricity(item) for item, neighbours in graph.get_neighbour_map().items()
+                            if neighbours)
+    quartiles = statistics.quantiles(eccentricities, n=4)
+    print(f'Eccentricity of non-isolated keywords: median {quartiles[1]}, upper quartile {quartiles[2]}, '
+          f'diameter {eccentricities[-1]}')
+
+    animes, inputs = sample_media(num_animes, num_inputs)
+    exact = {(a, b): a.keyword_comparison(b, graph) for a in animes for b in inputs}
+    results = {}
+    for cap in caps:
+        losses, times = [], []
+        for anime, item in exact:
+            start = time.perf_counter()
+            score = anime.keyword_comparison(item, graph, cap)
+            times.append((time.perf_counter() - start) * 1e3)
+            losses.append(exact[(anime, item)] - score)
+        percentiles = statistics.quantiles(times, n=100)
+        results[cap] = (statistics.mean(losses), max(losses), percentiles[49], percentiles[98])
+
+    for cap, (mean_loss, max_loss, p50, p99) in results.items():
+        print(f'max_depth={cap}: mean score loss {mean_loss:.4f}, max score loss {max_loss:.4f}, '
+              f'p50 {p50:.3f} ms, p99 {p99:.3f} ms')
+    return results
+
+
+def benchmark_catalog_distances(num_inputs: int = 5) -> dict[str, float]:
+    """Print and return the time in milliseconds taken to find the distance from every keyword of every anime in
+    final_animes.json to the nearest keyword of each of num_inputs random movies, using one Python multi-source
+    search per anime (CompactGraph.nearest_distances) and one vectorised search per movie
+    (CompactGraph.distances_to_set).
+    """
+    graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True)
+    animes, inputs = sample_media(796, num_inputs)
+    anime_words = [[keyword.lower() for keyword in anime.keywords] for anime in animes]
+    results = {}
+
+    start = time.perf_counter()
+    for item in inputs:
+        targets = {keyword.lower() for keyword in item.keywords}
+        for words in anime_words:
+            graph.nearest_distances(words, targets)
+    results['nearest_distances'] = (time.perf_counter() - start) * 1e3
+
+    start = time.perf_counter()
+    catalog_ids = [graph.vertex_id(word) for words in anime_words for word in words]
+    catalog_ids = [vertex_id for vertex_id in catalog_ids if vertex_id is not None]
+    catalog_distances = []
+    for item in inputs:
+        distances = graph.distances_to_set({keyword.lower() for keyword in item.keywords})
+        catalog_distances.append(distances[catalog_ids])
+    results['distances_to_set'] = (time.perf_counter() - start) * 1e3
+
+    for name, total_time in results.items():
+        print(f'Catalog keyword distances with {name}: {total_time:.1f} ms')
+    return results
+
+
+def benchmark_landmark_error(landmark_counts: tuple[int, ...] = (4, 8, 16, 32), num_pairs: int = 2000,
+                             num_animes: int = 100, num_inputs: int = 3) -> dict[int, tuple[float, float, int, float]]:
+    """Print and return, for each number of landmarks in landmark_counts, the error of a graph_classes.LandmarkOracle
+    on the keyword graph: its mean error in hops and the fraction of exact answers over num_pairs random connected
+    keyword pairs, its largest error, and the mean loss in keyword score compared to exact distances over random
+    anime and movie pairs.
+    """
+    graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True)
+    rng = random.Random(111)
+    words = [item for item, neighbours in graph.get_neighbour_map().items() if neighbours]
+    pairs = []
+    while len(pairs) < num_pairs:
+        word1, word2 = rng.choice(words), rng.choice(words)
+        if word1 != word2 and graph.connected(word1, word2):
+            pairs.append((word1, word2, graph.distance(word1, word2)))
+    animes, inputs = sample_media(num_animes, num_inputs)
+    exact_scores = {(a, b): a.keyword_comparison(b, graph) for a in animes for b in inputs}
+
+    results = {}
+    for count in landmark_counts:
+        oracle = graph_classes.LandmarkOracle(graph, count)
+        errors = [oracle.distance(word1, word2) - distance for word1, word2, distance in pairs]
+        score_losses = [exact_scores[(a, b)] - a.keyword_comparison(b, oracle) for a, b in exact_scores]
+        results[count] = (statistics.mean(errors), errors.count(0) / len(errors), max(errors),
+                          statistics.mean(score_losses))
+
+    for count, (mean_error, exact_fraction, max_error, score_loss) in results.items():
+        print(f'{count} landmarks: mean error {mean_error:.3f} hops, {exact_fraction:.1%} exact, '
+              f'max error {max_error} hops, mean keyword score loss {score_loss:.4f}')
+    return results
+
+
+def benchmark_catalog_scoring(num_inputs: int = 3) -> dict[str, float]:
+    """Print and return the time in milliseconds taken to score every anime in final_animes.json against
+    num_inputs random movies, with Media.compare on every pair (with and without a precomputed
+    recommendation_algorithm.QueryProfile) and with scoring_engine.score_catalog.
+    """
+    graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True)
+    animes, inputs = sample_media(796, num_inputs)
+    results = {}
+
+    start = time.perf_counter()
+    for anime in animes:
+        for item in inputs:
+            anime.compare(item, set(inputs), graph)
+    results['Media.compare'] = (time.perf_counter() - start) * 1e3
+
+    start = time.perf_counter()
+    profile = recommendation_algorithm.QueryProfile(inputs, graph)
+    for anime in animes:
+        for item in inputs:
+            anime.compare(item, profile, graph)
+    results['Media.compare with a QueryProfile'] = (time.perf_counter() - start) * 1e3
+
+    start = time.perf_counter()
+    catalog = scoring_engine.CatalogColumns(animes, graph)
+    scoring_engine.score_catalog(catalog, recommendation_algorithm.QueryProfile(inputs, graph), graph)
+    results['scoring_engine.score_catalog'] = (time.perf_counter() - start) * 1e3
+
+    for name, total_time in results.items():
+        print(f'Scoring the catalog with {name}: {total_time:.1f} ms')
+    return results
+
+
+def benchmark_pruning(ks: tuple[int, ...] = (1, 10, 50), num_inputs: int = 3, num_queries: int = 5) \
+        -> dict[int, tuple[float, float]]:
+    """Print and return, for each number of recommendations k in ks, the mean time in milliseconds taken to find
+    the best k animes in final_animes.json for num_queries random sets of num_inputs movies, by scoring every anime
+    (scoring_engine.top_k) and with upper-bound pruning (scoring_engine.pruned_top_k).
+    """
+    graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True)
+    animes, _ = sample_media(796, 0)
+    profiles = [recommendation_algorithm.QueryProfile(sample_media(0, num_inputs, seed)[1], graph)
+                for seed in range(num_queries)]
+    results = {}
+    for k in ks:
+        exhaustive_time = pruned_time = 0.0
+        for profile in profiles:
+            start = time.perf_counter()
+            exhaustive = scoring_engine.top_k(scoring_engine.score_candidates(animes, profile, graph), k)
+            exhaustive_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            pruned = scoring_engine.pruned_top_k(animes, profile, graph, k)
+            pruned_time += time.perf_counter() - start
+            assert [anime for _, anime in exhaustive] == [anime for _, anime in pruned]
+
+        results[k] = (exhaustive_time / num_queries * 1e3, pruned_time / num_queries * 1e3)
+        print(f'Top {k}: {results[k][0]:.1f} ms when scoring every anime, {results[k][1]:.1f} ms with pruning '
+              f'({results[k][0] / results[k][1]:.1f}x faster)')
+    return results
+
+
+def benchmark_pair_cache(num_inputs: int = 3, num_queries: int = 3) -> dict[str, float]:
+    """Print and return the time in milliseconds taken to score every anime in final_animes.json with Media.compare
+    against num_queries random sets of num_inputs movies, without a keyword pair cache, with a cold cache, and with
+    the cache left warm by running the same queries before. Also print the hit rate of the cache.
+    """
+    graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True)
+    animes, _ = sample_media(796, 0)
+    profiles = [recommendation_algorithm.QueryProfile(sample_media(0, num_inputs, seed)[1], graph)
+                for seed in range(num_queries)]
+    results = {}
+    for name in ('no cache', 'cold cache', 'warm cache'):
+        if name == 'cold cache':
+            graph.pair_cache = graph_classes.KeywordPairCache()
+        start = time.perf_counter()
+        for profile in profiles:
+            for _ in scoring_engine.score_candidates(animes, profile, graph):
+                pass
+        results[name] = (time.perf_counter() - start) / num_queries * 1e3
+        print(f'Scoring the catalog with {name}: {results[name]:.1f} ms per query')
+    print(f'Keyword pair cache: {len(graph.pair_cache)} pairs, {graph.pair_cache.hits} hits, '
+          f'{graph.pair_cache.misses} misses ({graph.pair_cache.hit_rate():.1%} hit rate)')
+    return results
+
+
+def benchmark_keyword_index(num_rec: int = 10, num_inputs: int = 3, num_queries: int = 8) -> dict[str, float]:
+    """Print and return the time in milliseconds taken to build a scoring_engine.KeywordIndex of final_animes.json,
+    and, over num_queries random sets of num_inputs movies, the mean number of candidates it generates, the mean time
+    of scoring_engine.get_recommendations with and without it, and the fraction of the num_rec recommendations found
+    by scoring the whole catalog that are also found from its candidates.
+    """
+    graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True)
+    start = time.perf_counter()
+    index = scoring_engine.KeywordIndex(scoring_engine.load_anime_entries(), graph)
+    results = {'build': (time.perf_counter() - start) * 1e3, 'candidates': 0.0, 'catalog': 0.0, 'index': 0.0,
+               'recall': 0.0}
+
+    rng = random.Random(111)
+    with open('datasets/filtered/final_imdb_movies.json', 'r') as f:
+        movies = json.load(f)
+    for _ in range(num_queries):
+        input_set = [(entry, 'movie') for entry in rng.sample(movies, num_inputs)]
+        profile = recommendation_algorithm.QueryProfile([Media(entry, form) for entry, form in input_set], graph)
+        results['candidates'] += len(index.candidates(profile)) / num_queries
+
+        start = time.perf_counter()
+        exact = scoring_engine.get_recommendations(input_set, num_rec, 0, set(), graph)
+        results['catalog'] += (time.perf_counter() - start) / num_queries * 1e3
+        start = time.perf_counter()
+        approximate = scoring_engine.get_recommendations(input_set, num_rec, 0, set(), graph, keyword_index=index)
+        results['index'] += (time.perf_counter() - start) / num_queries * 1e3
+        results['recall'] += len({anime.title for anime in exact} & {anime.title for anime in approximate}) \
+            / (num_rec * num_queries)
+
+    print(f'Keyword index: built in {results["build"]:.1f} ms, {results["candidates"]:.0f} of '
+          f'{len(index.entries)} animes generated as candidates per query')
+    print(f'Recommending from the whole catalog: {results["catalog"]:.1f} ms, from the index candidates: '
+          f'{results["index"]:.1f} ms ({results["recall"]:.0%} of the top {num_rec} found)')
+    return results
+
+
+def benchmark_parallel_scoring(worker_counts: tuple[int, ...] = (1, 2, 4, 8, 16), num_rec: int = 10,
+                               num_inputs: int = 3, num_queries: int = 3) -> dict[int, float]:
+    """Print and return, for each number of worker processes in worker_counts, the mean time in milliseconds taken
+    by scoring_engine.get_recommendations over num_queries random sets of num_inputs movies. Each pool is started
+    (and warmed up with one query) before it is timed. The speedup is limited by the cores of this machine.
+    """
+    rng = random.Random(111)
+    with open('datasets/filtered/final_imdb_movies.json', 'r') as f:
+        movies = json.load(f)
+    input_sets = [[(entry, 'movie') for entry in rng.sample(movies, num_inputs)] for _ in range(num_queries + 1)]
+    results = {}
+    for workers in worker_counts:
+        scoring_engine.get_recommendations(input_sets[-1], num_rec, 0, set(), workers=workers)
+        start = time.perf_counter()
+        for input_set in input_sets[:-1]:
+            scoring_engine.get_recommendations(input_set, num_rec, 0, set(), workers=workers)
+        results[workers] = (time.perf_counter() - start) / num_queries * 1e3
+        print(f'Recommending with {workers} worker process(es): {results[workers]:.1f} ms per query '
+              f'({os.cpu_count()} cores available)')
+    return results
+
+
+def compact_media(anime_entries: list[dict]) -> list[recommendation_algorithm.CompactMedia]:
+    """Return the CompactMedia of every anime in anime_entries, sharing one list of synopses, as in
+    anime_catalog.AnimeCatalog.
+    """
+    synopses = []
+    return [recommendation_algorithm.CompactMedia(entry, 'anime', synopses) for entry in anime_entries]
+
+
+def benchmark_catalog(num_rec: int = 10, num_inputs: int = 3, num_queries: int = 5) -> dict[str, float]:
+    """Print and return the number of bytes allocated to hold the anime catalog as Media and as CompactMedia, and
+    the time in milliseconds taken by scoring_engine.get_recommendations for the first query of a process (which
+    loads the catalog) and, on average, for num_queries later queries of random sets of num_inputs movies.
+    """
+    anime_entries = scoring_engine.load_anime_entries()
+    results = {}
+    for name, make_catalog in (('Media', lambda: [Media(entry, 'anime') for entry in anime_entries]),
+                               ('CompactMedia', lambda: compact_media(anime_entries))):
+        # Made once untraced so that the vocabularies already hold every genre and keyword.
+        make_catalog()
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        catalog = make_catalog()
+        before, _ = tracemalloc.get_traced_memory()
+        del catalog
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = before - after
+        print(f'Catalog of {name}: {results[name] / 1024:.1f} KiB '
+              f'({results[name] / len(anime_entries):.0f} bytes per anime)')
+
+    rng = random.Random(111)
+    with open('datasets/filtered/final_imdb_movies.json', 'r') as f:
+        movies = json.load(f)
+    input_sets = [[(entry, 'movie') for entry in rng.sample(movies, num_inputs)] for _ in range(num_queries + 1)]
+    # A holder of its own, which loads the catalog as the shared one does on the first query of a process, without
+    # replacing the shared one used by the other benchmarks.
+    holder = anime_catalog.CatalogHolder()
+    start = time.perf_counter()
+    scoring_engine.get_recommendations(input_sets[-1], num_rec, 0, set(), catalog=holder.get())
+    results['first query'] = (time.perf_counter() - start) * 1e3
+    start = time.perf_counter()
+    for input_set in input_sets[:-1]:
+        scoring_engine.get_recommendations(input_set, num_rec, 0, set(), catalog=holder.get())
+    results['later queries'] = (time.perf_counter() - start) / num_queries * 1e3
+    print(f'Recommending: {results["first query"]:.1f} ms for the first query, '
+          f'{results["later queries"]:.1f} ms per later query')
+    return results
+
+
+def benchmark_cli_cold_start(num_runs: int = 5, num_rec: int = 10, num_inputs: int = 3) -> dict[str, float]:
+    """Print and return the mean time in milliseconds taken by a new process to start and exit, and to print the
+    recommendations of recommend.py for random sets of num_inputs movies without the result cache, over num_runs runs
+    of each.
+    """
+    rng = random.Random(111)
+    with open('datasets/filtered/final_imdb_movies.json', 'r') as f:
+        movies = json.load(f)
+    commands = {
+        'empty process': [[sys.executable, '-c', 'pass'] for _ in range(num_runs)],
+        'recommend.py': [[sys.executable, '-m', 'recommend', '--no-cache', '-k', str(num_rec)]
+                         + [entry['title'] for entry in rng.sample(movies, num_inputs)] for _ in range(num_runs)]
+    }
+    results = {}
+    for name, runs in commands.items():
+        start = time.perf_counter()
+        for command in runs:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        results[name] = (time.perf_counter() - start) / num_runs * 1e3
+        print(f'Cold start of {name}: {results[name]:.1f} ms')
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_graph_memory()
+    benchmark_graph_lookup()
+    benchmark_graph_loading()
+    benchmark_depth_caps()
+    benchmark_catalog_distances()
+    benchmark_landmark_error()
+    benchmark_catalog_scoring()
+    benchmark_pruning()
+    benchmark_pair_cache()
+    benchmark_keyword_index()
+    benchmark_parallel_scoring()
+    benchmark_catalog()
+    benchmark_cli_cold_start()
+
+    # Enabling python_ta configurations:
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['ast', 'json', 'os', 'random', 'statistics', 'subprocess', 'sys', 'tempfile', 'time',
+                          'tracemalloc', 'typing', 'anime_catalog', 'graph_classes', 'recommendation_algorithm',
+                          'scoring_engine'],
+        'allowed-io': ['read_keyword_graph_file', 'benchmark_graph_memory', 'benchmark_graph_lookup',
+                       'benchmark_graph_loading', 'sample_media', 'benchmark_depth_caps',
+                       'benchmark_catalog_distances', 'benchmark_landmark_error', 'benchmark_catalog_scoring',
+                       'benchmark_pruning', 'benchmark_pair_cache', 'benchmark_keyword_index',
+                       'benchmark_parallel_scoring', 'benchmark_catalog', 'benchmark_cli_cold_start'],
+        'max-line-length': 120,
+    })
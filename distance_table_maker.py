@@ -0,0 +1,47 @@
+"""CSC111 Course Project: distance_table_maker.py
+
+Module description
+===============================
+
+This Python module is responsible for creating the keyword distance table (keyword_distances.npy and
+keyword_distances.json) from keyword_graph.txt. The table stores the distance between every pair of keywords as a
+single byte, so that Media.keyword_comparison can look distances up instead of searching the keyword graph.
+
+Since the keyword graph only changes when keyword_graph_maker.py is run again, this file only needs to be run after
+keyword_graph.txt has been (re)created.
+
+This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
+"""
+from typing import Optional
+
+import graph_classes
+import recommendation_algorithm
+
+
+def write_distance_table(max_depth: Optional[int] = None,
+                         matrix_file: str = recommendation_algorithm.DISTANCE_MATRIX_FILE,
+                         vocabulary_file: str = recommendation_algorithm.DISTANCE_VOCABULARY_FILE) \
+        -> graph_classes.DistanceTable:
+    """Compute the distance between every pair of keywords in keyword_graph.txt, write the resulting table to
+    matrix_file and vocabulary_file, and return it.
+
+    If max_depth is given, only distances of at most max_depth edges are stored, and every other pair is recorded as
+    unreachable. Media.keyword_comparison then scores such pairs as if it had been called with this max_depth.
+    """
+    keyword_graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True)
+    table = graph_classes.DistanceTable.from_graph(keyword_graph, max_depth)
+    table.save(matrix_file, vocabulary_file)
+    return table
+
+
+if __name__ == '__main__':
+    write_distance_table()
+
+    # Enabling python_ta configurations:
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'graph_classes', 'recommendation_algorithm'],
+        'allowed-io': [],
+        'max-line-length': 120,
+    })
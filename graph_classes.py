@@ -3,17 +3,37 @@ Module description
 ===============================
 
 This Python module is responsible for implementing the graph and vertex classes used to store keyword vertices. It
-implements a shortest_path method using a breadth-first search algorithm that is central to our final recommendation
-algorithm. It also implements various other helpful methods in both the vertex and graph classes that are useful in
-creating our final keyword graph.
+implements a distance method using a bidirectional breadth-first search algorithm that is central to our final
+recommendation algorithm. It also implements various other helpful methods in both the vertex and graph classes that
+are useful in creating our final keyword graph.
+
+It also implements CompactGraph, an array-backed alternative to Graph. CompactGraph interns every item to an integer
+id and stores its adjacency in compressed sparse row (CSR) form, which takes far less memory than a set of _Vertex
+objects while keeping the same public methods. A CompactGraph can be written to a binary snapshot file, which is
+loaded back by memory-mapping it instead of parsing it. Its CSR arrays also let it run many breadth-first searches at
+once with numpy, expanding each level of every search with a handful of array operations.
+
+Finally, it implements DistanceTable, a precomputed table of the distances between every pair of keywords that can be
+saved to disk and memory-mapped, so that looking up keyword distances needs no graph traversal at all. For graphs too
+large for such a table, LandmarkOracle estimates distances from the distances to a few landmark vertices instead, and
+HopBitsetIndex answers short distances (up to a few hops) with bitwise operations.
+
+Both graph classes can also be given a KeywordPairCache, a bounded least recently used cache of the distances between
+pairs of vertices that their nearest_distances methods fill and reuse, so that keyword pairs that come up in query
+after query are only searched for once.
 
 This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
 """
 from __future__ import annotations
-from typing import Any
+from typing import Any, Callable, Iterable, Optional, Union
+from bisect import bisect_left
+import json
+import mmap
+import os
+import struct
+from collections import OrderedDict, deque
 
-# This is used in the shortest_path method of the Graph class.
-from queue import Queue
+import numpy as np
 
 
 class _Vertex:
@@ -58,22 +78,195 @@ class _Vertex:
             return False
 
 
+# The header of a CompactGraph snapshot file: a magic string, the number of vertices, the length of the neighbour
+# array, and the number of bytes taken by the items.
+_SNAPSHOT_HEADER = struct.Struct('<8sQQQ')
+_SNAPSHOT_MAGIC = b'KWGRAPH1'
+
+
+class _DisjointSets:
+    """A union-find (disjoint-set) structure, used by the graph classes to keep track of connected components as
+    edges are added. Uses union by size and path halving, so every operation takes nearly constant time.
+
+    Instance Attributes:
+        - parents: maps each element to its parent element; the root of each set maps to itself
+        - sizes: maps the root of each set to the number of elements in that set
+        - num_sets: the number of disjoint sets
+
+    Representation Invariants:
+        - self.num_sets == len(self.sizes)
+        - all(self.parents[root] == root for root in self.sizes)
+    """
+    parents: dict[Any, Any]
+    sizes: dict[Any, int]
+    num_sets: int
+
+    def __init__(self) -> None:
+        """Initialize an empty collection of sets."""
+        self.parents = {}
+        self.sizes = {}
+        self.num_sets = 0
+
+    @classmethod
+    def from_labels(cls, labels: list[int]) -> _DisjointSets:
+        """Return the sets over the elements 0, 1, ..., len(labels) - 1 in which element i is in the same set as the
+        element labels[i].
+
+        Preconditions:
+            - all(labels[label] == label for label in labels)
+        """
+        sets = cls()
+        sets.parents = dict(enumerate(labels))
+        for label in labels:
+            sets.sizes[label] = sets.sizes.get(label, 0) + 1
+        sets.num_sets = len(sets.sizes)
+        return sets
+
+    def add(self, element: Any) -> None:
+        """Add element as a new set of its own.
+
+        Preconditions:
+            - element not in self.parents
+        """
+        self.parents[element] = element
+        self.sizes[element] = 1
+        self.num_sets += 1
+
+    def find(self, element: Any) -> Any:
+        """Return the root of the set containing element.
+
+        Preconditions:
+            - element in self.parents
+        """
+        parents = self.parents
+        while parents[element] != element:
+            parents[element] = parents[parents[element]]
+            element = parents[element]
+        return element
+
+    def union(self, element1: Any, element2: Any) -> None:
+        """Merge the sets containing element1 and element2.
+
+        Preconditions:
+            - element1 in self.parents and element2 in self.parents
+        """
+        root1, root2 = self.find(element1), self.find(element2)
+        if root1 != root2:
+            if self.sizes[root1] < self.sizes[root2]:
+                root1, root2 = root2, root1
+            self.parents[root2] = root1
+            self.sizes[root1] += self.sizes.pop(root2)
+            self.num_sets -= 1
+
+
+class KeywordPairCache:
+    """A bounded cache of the distances between pairs of vertices, keyed on their integer ids and the depth cap of
+    the search that found them, which evicts the least recently used pair once it is full.
+
+    A distance of None means that the vertices are not connected (within the depth cap, if there is one). A cache is
+    not locked, so it must only be used by one thread at a time.
+
+    Instance Attributes:
+        - capacity: the greatest number of pairs kept in the cache
+        - hits: the number of lookups that found their pair in the cache
+        - misses: the number of lookups that did not
+        - _entries: maps (smaller id, larger id, depth cap) to the distance between the two vertices, from the least
+          to the most recently used
+
+    Representation Invariants:
+        - self.capacity > 0
+        - len(self._entries) <= self.capacity
+        - all(key[0] <= key[1] for key in self._entries)
+    """
+    capacity: int
+    hits: int
+    misses: int
+    _entries: OrderedDict[tuple[int, int, Optional[int]], Optional[int]]
+
+    def __init__(self, capacity: int = 1 << 18) -> None:
+        """Initialize an empty cache holding at most capacity pairs.
+
+        Preconditions:
+            - capacity > 0
+        """
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return the number of pairs in the cache."""
+        return len(self._entries)
+
+    def lookup(self, id1: int, id2: int, max_depth: Optional[int] = None) -> tuple[bool, Optional[int]]:
+        """Return whether the distance between the vertices with ids id1 and id2 (found with the given depth cap)
+        is in the cache, and that distance if it is.
+
+        >>> cache = KeywordPairCache()
+        >>> cache.store(3, 1, None, 2)
+        >>> cache.lookup(1, 3)
+        (True, 2)
+        >>> cache.lookup(1, 3, 1)
+        (False, None)
+        """
+        key = (id1, id2, max_depth) if id1 <= id2 else (id2, id1, max_depth)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, self._entries[key]
+        else:
+            self.misses += 1
+            return False, None
+
+    def store(self, id1: int, id2: int, max_depth: Optional[int], distance: Optional[int]) -> None:
+        """Store the distance between the vertices with ids id1 and id2, found with the given depth cap, evicting
+        the least recently used pair if the cache is full.
+        """
+        key = (id1, id2, max_depth) if id1 <= id2 else (id2, id1, max_depth)
+        self._entries[key] = distance
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every pair from the cache. The hit and miss counters are kept.
+        """
+        self._entries.clear()
+
+    def hit_rate(self) -> float:
+        """Return the fraction of lookups that found their pair in the cache, or 0.0 if there were none.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
 class Graph:
     """Graph class.
 
     Instance Attributes:
+        - pair_cache: a cache of the distances between pairs of vertices that nearest_distances fills and reuses, or
+          None to search for every distance
         - _vertices: set of vertices in the graph
+        - _ids: maps each item to an integer id, used as its key in pair_cache
+        - _components: the connected components of the graph, keyed by item and updated as edges are added
 
     Representation Invariants:
         - For each key in self._vertices, the corresponding vertex's item attribute
           equals that key
+        - self._components.parents.keys() == self._vertices.keys() == self._ids.keys()
     """
+    pair_cache: Optional[KeywordPairCache]
     _vertices: dict[Any, _Vertex]
+    _ids: dict[Any, int]
+    _components: _DisjointSets
 
     def __init__(self) -> None:
         """Initialize an empty graph (no vertices or edges).
         """
+        self.pair_cache = None
         self._vertices = {}
+        self._ids = {}
+        self._components = _DisjointSets()
 
     def add_vertex(self, item: Any) -> None:
         """Add a vertex with the given item to this graph.
@@ -84,6 +277,8 @@ class Graph:
         """
         new_vertex = _Vertex(item, set())
         self._vertices[item] = new_vertex
+        self._ids[item] = len(self._ids)
+        self._components.add(item)
 
     def add_edge(self, item1: Any, item2: Any) -> None:
         """Add an edge between the two vertices with the given items in this graph.
@@ -97,6 +292,9 @@ class Graph:
             v2 = self._vertices[item2]
             v1.neighbours.add(v2)
             v2.neighbours.add(v1)
+            self._components.union(item1, item2)
+            if self.pair_cache is not None:  # The new edge may shorten any cached distance
+                self.pair_cache.clear()
         else:
             raise ValueError
 
@@ -138,22 +336,90 @@ class Graph:
         Return False if item1 or item2 do not appear as vertices in this graph.
         """
         if item1 in self._vertices and item2 in self._vertices:
-            v1 = self._vertices[item1]
-            return v1.check_connected(item2, set())
+            return self._components.find(item1) == self._components.find(item2)
         else:
             return False
 
+    def component(self, item: Any) -> Optional[Any]:
+        """Return a label for the connected component containing the vertex with the given item, or None if item
+        does not appear as a vertex in this graph. Two vertices are connected exactly when their labels are equal.
+        """
+        if item in self._vertices:
+            return self._components.find(item)
+        else:
+            return None
+
+    def num_components(self) -> int:
+        """Return the number of connected components in this graph.
+        """
+        return self._components.num_sets
+
     def is_connected_graph(self) -> bool:
         """Return whether this graph is connected, i.e., for all u, v in this graph's vertices, there exists a path.
         """
-        n = len(self._vertices)
-        e = self.num_edges()
-        if e >= (n - 1) * (n - 2) // 2 + 1:
-            return True
-        elif e < n - 1:
-            return False
+        return self._components.num_sets <= 1
+
+    def distance(self, start: Any, end: Any, max_depth: Optional[int] = None) -> Optional[int]:
+        """Return the number of edges on the shortest path between the vertices with items start and end.
+        Return None if start and end are not connected, or if either does not appear as a vertex in this graph.
+
+        If max_depth is given, the search gives up once every path of at most max_depth edges has been ruled out,
+        and None is returned for such far-apart vertices as well.
+
+        Unlike shortest_path, this method never builds the path itself.
+        """
+        if self.connected(start, end):
+            search = _bidirectional_search(self._vertices[start], self._vertices[end], _vertex_neighbours, max_depth)
+            return None if search is None else search[0]
+        else:
+            return None
+
+    def nearest_distances(self, sources: Iterable, targets: Iterable,
+                          max_depth: Optional[int] = None) -> dict[Any, Optional[int]]:
+        """Return a dictionary mapping each item in sources to the number of edges between its vertex and the
+        nearest vertex whose item is in targets, or to None if no such vertex is connected to it (or within
+        max_depth edges of it, if max_depth is given). Items that do not appear as vertices map to None.
+
+        All distances come from a single breadth-first search seeded with every target at once, instead of one
+        search per pair of source and target. If this graph has a pair_cache, the distances of each source to the
+        targets are instead looked up there, and only the sources with uncached pairs are searched from, by a single
+        search seeded with all of them (see _cached_nearest_distances).
+        """
+        sources = list(sources)
+        source_vertices = [self._vertices[item] for item in sources if item in self._vertices]
+        target_vertices = [self._vertices[item] for item in targets if item in self._vertices]
+        if self.pair_cache is not None:
+            distances = _cached_nearest_distances(source_vertices, target_vertices, _vertex_neighbours,
+                                                  lambda vertex: self._components.find(vertex.item),
+                                                  lambda vertex: self._ids[vertex.item], self.pair_cache, max_depth)
         else:
-            return all(self.connected(u, v) for u in self._vertices for v in self._vertices)
+            distances = _nearest_distances(source_vertices, target_vertices, _vertex_neighbours,
+                                           lambda vertex: self._components.find(vertex.item), max_depth)
+        return {item: distances.get(self._vertices[item]) if item in self._vertices else None for item in sources}
+
+    def distances_from(self, item: Any, max_depth: Optional[int] = None) -> dict[Any, int]:
+        """Return a dictionary mapping the item of every vertex within max_depth edges of the vertex with the given
+        item (or every vertex connected to it, if max_depth is None) to its distance from that vertex.
+        Return an empty dictionary if item does not appear as a vertex in this graph.
+        """
+        if item in self._vertices:
+            distances = _breadth_first_distances([self._vertices[item]], _vertex_neighbours, max_depth)
+            return {vertex.item: distance for vertex, distance in distances.items()}
+        else:
+            return {}
+
+    def eccentricity(self, item: Any) -> Optional[int]:
+        """Return the greatest distance from the vertex with the given item to any vertex connected to it, or None
+        if item does not appear as a vertex in this graph.
+        """
+        distances = self.distances_from(item)
+        return max(distances.values()) if distances else None
+
+    def diameter(self) -> int:
+        """Return the greatest distance between any two connected vertices in this graph.
+        This runs a breadth-first search from every vertex, so it is meant for offline analysis only.
+        """
+        return max((self.eccentricity(item) for item in self._vertices), default=0)
 
     def shortest_path(self, start: Any, end: Any) -> tuple[int, list] | bool:
         """Finds the shortest path from vertex with item start to vertex with item end using a Breadth First Search.
@@ -162,55 +428,936 @@ class Graph:
         the shortest path, measured as the number of vertices in the path, and a list representing the path itself,
         containing the vertices in the path. Otherwise, function returns False.
 
-        Process:
-             - Track paths, not nodes as in naive BFS
-             - Start queue with a path that has only start
-             - Until queue is empty
-                - Add current node to visited
-                - Add current no
-                - Get latest path
-                - Get latest node in path
-                - If latest node is already end, return
-                - If latest node is not already end, add new paths to the queue incremented by neighbours that haven't
-                been visited.
-                - Repeat
-
-        Intuition:
-            - Goes level by level until end is reached. This means that the first time end is reached, we have the
-            shortest path.
+        The search runs from both ends at once (see _bidirectional_search), and the path is rebuilt from the parents
+        recorded by each side only once the two searches meet. Vertices in different components are rejected
+        without searching at all.
         """
         if self.connected(start, end):
-            tracker = Queue()
-            visited = set()
+            search = _bidirectional_search(self._vertices[start], self._vertices[end], _vertex_neighbours)
+            if search is not None:
+                path = [vertex.item for vertex in _join_path(*search[1:])]
+                return len(path), path
+        # If start and end are not connected by a path, there is no shortest path.
+        return False
 
-            # Find vertex corresponding to start
-            current_node = self._vertices[start]
 
-            # Queue initial path - consists only of one vertex, that corresponding to start.
-            tracker.put([current_node])
+class CompactGraph:
+    """An undirected graph stored in compressed sparse row (CSR) form.
 
-            # Iterate till the tracker is empty.
-            while tracker:
-                # Get least recently added path and the farthest vertex from it.
-                current_path = tracker.get()
-                current_node = current_path[-1]
-                visited.add(current_node)
+    Every item is interned to an integer id. The neighbours of the vertex with id i are
+    self._neighbours[self._offsets[i]:self._offsets[i + 1]], sorted in increasing order.
+    Edges added since the last lookup are kept in self._pending and merged into the arrays the next time the
+    adjacency is read, so building the graph one edge at a time stays cheap.
 
-                # Return path if we are currently at end.
-                if current_node.item == end:
-                    path = [node.item for node in current_path]
-                    return len(path), path
+    Instance Attributes:
+        - pair_cache: a cache of the distances between pairs of vertices that nearest_distances fills and reuses, or
+          None to search for every distance
+        - _ids: maps each item to its integer id
+        - _items: maps each integer id back to its item
+        - _offsets: int32 array of length len(self._items) + 1 delimiting each vertex's neighbours
+        - _neighbours: int32 array of the neighbour ids of every vertex, concatenated
+        - _pending: edges (as pairs of ids, smaller id first) not yet merged into the CSR arrays
+        - _components: the connected components of the graph, keyed by vertex id and updated as edges are added
+        - _offsets_view: a memoryview of self._offsets
+        - _neighbour_view: a memoryview of self._neighbours
+
+    Representation Invariants:
+        - all(self._items[self._ids[item]] == item for item in self._ids)
+        - len(self._offsets) == len(self._items) + 1 or self._pending != set()
+        - all(u < v for u, v in self._pending)
+    """
+    pair_cache: Optional[KeywordPairCache]
+    _ids: dict[Any, int]
+    _items: list[Any]
+    _offsets: np.ndarray
+    _neighbours: np.ndarray
+    _pending: set[tuple[int, int]]
+    _components: _DisjointSets
+    _offsets_view: memoryview
+    _neighbour_view: memoryview
+
+    def __init__(self) -> None:
+        """Initialize an empty graph (no vertices or edges).
+        """
+        self.pair_cache = None
+        self._ids = {}
+        self._items = []
+        self._offsets = np.zeros(1, dtype=np.int32)
+        self._neighbours = np.zeros(0, dtype=np.int32)
+        self._pending = set()
+        self._components = _DisjointSets()
+        self._refresh_views()
+
+    @classmethod
+    def from_snapshot(cls, filename: str) -> CompactGraph:
+        """Return the graph stored in the snapshot file filename, written by CompactGraph.write_snapshot.
+
+        The file is memory-mapped, and the CSR arrays are read straight out of the mapping, so loading takes almost
+        no time and processes forked after loading share the same physical pages.
+        Raise a ValueError if filename is not a snapshot file.
+        """
+        with open(filename, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, num_vertices, num_entries, vocabulary_size = _SNAPSHOT_HEADER.unpack_from(buffer)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError
+
+        position = _SNAPSHOT_HEADER.size
+        offsets = np.frombuffer(buffer, dtype=np.int32, count=num_vertices + 1, offset=position)
+        position += offsets.nbytes
+        neighbours = np.frombuffer(buffer, dtype=np.int32, count=num_entries, offset=position)
+        position += neighbours.nbytes
+        labels = np.frombuffer(buffer, dtype=np.int32, count=num_vertices, offset=position)
+        position += labels.nbytes
+        vocabulary = buffer[position:position + vocabulary_size].decode('utf-8')
+
+        graph = cls()
+        graph._items = vocabulary.split('\n') if num_vertices > 0 else []
+        graph._ids = {item: i for i, item in enumerate(graph._items)}
+        graph._offsets = offsets
+        graph._neighbours = neighbours
+        graph._components = _DisjointSets.from_labels(labels.tolist())
+        graph._refresh_views()
+        return graph
+
+    def write_snapshot(self, filename: str) -> None:
+        """Write this graph to the binary snapshot file filename, to be loaded with CompactGraph.from_snapshot.
+
+        The file holds a header, the CSR arrays, the component label of every vertex, and finally the items
+        (in id order) separated by newlines. It is written under a temporary name and then moved into place, so
+        processes that have the old snapshot memory-mapped are not disturbed.
+
+        Preconditions:
+            - all(isinstance(item, str) and '\\n' not in item for item in self._ids)
+        """
+        self._compact()
+        labels = np.array([self._components.find(i) for i in range(len(self._items))], dtype=np.int32)
+        vocabulary = '\n'.join(self._items).encode('utf-8')
+        temporary_file = filename + '.tmp'
+        with open(temporary_file, 'wb') as f:
+            f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, len(self._items), len(self._neighbours), len(vocabulary)))
+            f.write(self._offsets.astype(np.int32).tobytes())
+            f.write(self._neighbours.astype(np.int32).tobytes())
+            f.write(labels.tobytes())
+            f.write(vocabulary)
+        os.replace(temporary_file, filename)
+
+    def add_vertex(self, item: Any) -> None:
+        """Add a vertex with the given item to this graph.
+        The new vertex is not adjacent to any other vertices.
+
+        Preconditions:
+            - item not in self._ids
+        """
+        self._ids[item] = len(self._items)
+        self._components.add(len(self._items))
+        self._items.append(item)
+
+    def add_edge(self, item1: Any, item2: Any) -> None:
+        """Add an edge between the two vertices with the given items in this graph.
+        Raise a ValueError if item1 or item2 do not appear as vertices in this graph.
 
-                # Queue new paths, where a new path is created if current_node's neighbours have not yet been visited.
-                for neighbour in current_node.neighbours:
-                    if neighbour not in visited:
-                        tracker.put(current_path + [neighbour])
+        Preconditions:
+            - item1 != item2
+        """
+        if item1 in self._ids and item2 in self._ids:
+            u, v = self._ids[item1], self._ids[item2]
+            self._pending.add((min(u, v), max(u, v)))
+            self._components.union(u, v)
+            if self.pair_cache is not None:  # The new edge may shorten any cached distance
+                self.pair_cache.clear()
+        else:
+            raise ValueError
 
+    def add_all_edges(self, edges: set[tuple[Any, Any]]) -> None:
+        """Add all given edges to this graph.
+
+        Preconditions:
+        - all(edge[0] != edge[1] for edge in edges)
+        """
+        for edge in edges:
+            for item in edge:
+                if item not in self._ids:
+                    self.add_vertex(item)
+            self.add_edge(edge[0], edge[1])
+
+    def adjacent(self, item1: Any, item2: Any) -> bool:
+        """Return whether item1 and item2 are adjacent vertices in this graph.
+        Return False if item1 or item2 do not appear as vertices in this graph.
+        """
+        if item1 in self._ids and item2 in self._ids:
+            row = self._neighbour_ids(self._ids[item1])
+            target = self._ids[item2]
+            i = bisect_left(row, target)
+            return i < len(row) and row[i] == target
+        else:
             return False
-        # If start and end are not connected by a path, there is no shortest path.
+
+    def num_edges(self) -> int:
+        """Return the number of edges in this graph.
+        """
+        self._compact()
+        return len(self._neighbours) // 2
+
+    def get_neighbour_map(self) -> dict[Any, tuple]:
+        """Returns a dictionary mapping the item at every vertex to a tuple of the items at its neighbours.
+        """
+        return {item: tuple(self._items[j] for j in self._neighbour_ids(i)) for i, item in enumerate(self._items)}
+
+    def connected(self, item1: Any, item2: Any) -> bool:
+        """Return whether item1 and item2 are connected vertices in this graph.
+        Return False if item1 or item2 do not appear as vertices in this graph.
+        """
+        if item1 in self._ids and item2 in self._ids:
+            return self._components.find(self._ids[item1]) == self._components.find(self._ids[item2])
         else:
             return False
 
+    def component(self, item: Any) -> Optional[int]:
+        """Return a label for the connected component containing the vertex with the given item, or None if item
+        does not appear as a vertex in this graph. Two vertices are connected exactly when their labels are equal.
+        """
+        if item in self._ids:
+            return self._components.find(self._ids[item])
+        else:
+            return None
+
+    def num_components(self) -> int:
+        """Return the number of connected components in this graph.
+        """
+        return self._components.num_sets
+
+    def is_connected_graph(self) -> bool:
+        """Return whether this graph is connected, i.e., for all u, v in this graph's vertices, there exists a path.
+        """
+        return self._components.num_sets <= 1
+
+    def distance(self, start: Any, end: Any, max_depth: Optional[int] = None) -> Optional[int]:
+        """Return the number of edges on the shortest path between the vertices with items start and end.
+        Return None if start and end are not connected, or if either does not appear as a vertex in this graph.
+
+        If max_depth is given, None is also returned when the shortest path has more than max_depth edges.
+        """
+        if self.connected(start, end):
+            search = _bidirectional_search(self._ids[start], self._ids[end], self._neighbour_ids, max_depth)
+            return None if search is None else search[0]
+        else:
+            return None
+
+    def nearest_distances(self, sources: Iterable, targets: Iterable,
+                          max_depth: Optional[int] = None) -> dict[Any, Optional[int]]:
+        """Return a dictionary mapping each item in sources to the number of edges between its vertex and the
+        nearest vertex whose item is in targets, or to None if no such vertex is connected to it (or within
+        max_depth edges of it, if max_depth is given). Items that do not appear as vertices map to None.
+        If this graph has a pair_cache, it is used as in Graph.nearest_distances.
+        """
+        sources = list(sources)
+        source_ids = [self._ids[item] for item in sources if item in self._ids]
+        target_ids = [self._ids[item] for item in targets if item in self._ids]
+        if self.pair_cache is not None:
+            distances = _cached_nearest_distances(source_ids, target_ids, self._neighbour_ids, self._components.find,
+                                                  lambda vertex_id: vertex_id, self.pair_cache, max_depth)
+        else:
+            distances = _nearest_distances(source_ids, target_ids, self._neighbour_ids, self._components.find,
+                                           max_depth)
+        return {item: distances.get(self._ids[item]) if item in self._ids else None for item in sources}
+
+    def distances_from(self, item: Any, max_depth: Optional[int] = None) -> dict[Any, int]:
+        """Return a dictionary mapping the item of every vertex within max_depth edges of the vertex with the given
+        item (or every vertex connected to it, if max_depth is None) to its distance from that vertex.
+        Return an empty dictionary if item does not appear as a vertex in this graph.
+        """
+        if item in self._ids:
+            distances = _breadth_first_distances([self._ids[item]], self._neighbour_ids, max_depth)
+            return {self._items[vertex_id]: distance for vertex_id, distance in distances.items()}
+        else:
+            return {}
+
+    def eccentricity(self, item: Any) -> Optional[int]:
+        """Return the greatest distance from the vertex with the given item to any vertex connected to it, or None
+        if item does not appear as a vertex in this graph.
+        """
+        distances = self.distances_from(item)
+        return max(distances.values()) if distances else None
+
+    def diameter(self) -> int:
+        """Return the greatest distance between any two connected vertices in this graph.
+        This runs a breadth-first search from every vertex, so it is meant for offline analysis only.
+        """
+        return max((self.eccentricity(item) for item in self._items), default=0)
+
+    def shortest_path(self, start: Any, end: Any) -> tuple[int, list] | bool:
+        """Finds the shortest path from vertex with item start to vertex with item end using a Breadth First Search.
+
+        Returns the same values as Graph.shortest_path: a tuple of the number of vertices in the shortest path and the
+        list of items along it if start and end are connected, and False otherwise.
+        """
+        if self.connected(start, end):
+            search = _bidirectional_search(self._ids[start], self._ids[end], self._neighbour_ids)
+            if search is not None:
+                path = [self._items[vertex_id] for vertex_id in _join_path(*search[1:])]
+                return len(path), path
+        return False
+
+    def batch_distances(self, sources: Iterable, max_depth: Optional[int] = None,
+                        batch_size: int = 64) -> np.ndarray:
+        """Return a uint8 matrix with one row per item in sources, where entry [i, j] is the distance from the i-th
+        source to the vertex with id j (see CompactGraph.items), or DistanceTable.UNREACHABLE if they are not
+        connected (or are more than max_depth edges apart, if max_depth is given). Rows of items that do not appear
+        as vertices are entirely UNREACHABLE.
+
+        The searches from all sources run together, batch_size sources at a time (see _frontier_search).
+
+        Preconditions:
+            - batch_size >= 1
+        """
+        self._compact()
+        source_ids = np.array([self._ids.get(item, -1) for item in sources], dtype=np.int64)
+        distances = np.full((len(source_ids), len(self._items)), DistanceTable.UNREACHABLE, dtype=np.uint8)
+        found = np.flatnonzero(source_ids >= 0)
+        distances[found, source_ids[found]] = 0
+
+        # Only sources with neighbours need searching; every other source reaches nothing but itself.
+        degrees = np.diff(self._offsets)
+        rows = found[degrees[source_ids[found]] > 0]
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            seeds = np.zeros((len(batch), len(self._items)), dtype=bool)
+            seeds[np.arange(len(batch)), source_ids[batch]] = True
+            distances[batch] = self._frontier_search(seeds, max_depth)
+        return distances
+
+    def distances_to_set(self, targets: Iterable, max_depth: Optional[int] = None) -> np.ndarray:
+        """Return a uint8 array where entry j is the distance from the vertex with id j to the nearest vertex whose
+        item is in targets, or DistanceTable.UNREACHABLE if there is none (within max_depth edges, if given).
+
+        Indexing the result with the ids of many keywords gives all of their distances to targets at once, which is
+        how a whole catalog of keywords can be compared against one set of keywords.
+        """
+        return self.distances_to_ids([self._ids[item] for item in targets if item in self._ids], max_depth)
+
+    def distances_to_ids(self, target_ids: Iterable[int], max_depth: Optional[int] = None) -> np.ndarray:
+        """Return the same array as distances_to_set, for the targets with the given vertex ids.
+
+        Preconditions:
+            - all(0 <= target_id < len(self.items()) for target_id in target_ids)
+        """
+        seeds = np.zeros((1, len(self._items)), dtype=bool)
+        seeds[0, list(target_ids)] = True
+        return self._frontier_search(seeds, max_depth)[0]
+
+    def _frontier_search(self, seeds: np.ndarray, max_depth: Optional[int] = None) -> np.ndarray:
+        """Return the uint8 matrix of distances found by running one breadth-first search per row of seeds, where
+        each search starts from the vertices whose entries are True in that row.
+
+        Process:
+            - Keep a boolean frontier matrix (one row per search, one column per vertex).
+            - Gather the frontier entries of every neighbour in self._neighbours, then OR them together within each
+            vertex's CSR segment with np.logical_or.reduceat, giving every vertex adjacent to the frontier.
+            - The next frontier is the newly reached vertices, which are recorded at the current depth.
+        """
+        self._compact()
+        unreachable = DistanceTable.UNREACHABLE
+        distances = np.full(seeds.shape, unreachable, dtype=np.uint8)
+        distances[seeds] = 0
+
+        # Vertices without neighbours can only be reached as seeds, so the search works only on the columns of the
+        # other vertices. This also gives reduceat the strictly increasing segment starts that it needs.
+        has_neighbours = np.flatnonzero(np.diff(self._offsets))
+        if len(has_neighbours) == 0:
+            return distances
+        columns = np.zeros(len(self._items), dtype=np.int64)
+        columns[has_neighbours] = np.arange(len(has_neighbours))
+        neighbour_columns = columns[self._neighbours]
+        segment_starts = self._offsets[has_neighbours]
+
+        frontier = seeds[:, has_neighbours]
+        visited = frontier.copy()
+        local_distances = distances[:, has_neighbours]
+        depth = 0
+        while frontier.any() and depth < unreachable - 1 and (max_depth is None or depth < max_depth):
+            depth += 1
+            frontier = np.logical_or.reduceat(frontier[:, neighbour_columns], segment_starts, axis=1) & ~visited
+            visited |= frontier
+            local_distances[frontier] = depth
+        distances[:, has_neighbours] = local_distances
+        return distances
+
+    def items(self) -> list[Any]:
+        """Return the items of the vertices of this graph, ordered by their integer ids.
+        """
+        return list(self._items)
+
+    def vertex_id(self, item: Any) -> Optional[int]:
+        """Return the integer id of the vertex with the given item, or None if item does not appear as a vertex in
+        this graph.
+        """
+        return self._ids.get(item)
+
+    def _neighbour_ids(self, vertex_id: int) -> memoryview:
+        """Return the sorted ids of the neighbours of the vertex with id vertex_id.
+
+        The returned memoryview shares memory with self._neighbours, and indexing it yields plain Python ints, which
+        keeps pure-Python traversals over the arrays fast.
+        """
+        self._compact()
+        return self._neighbour_view[self._offsets_view[vertex_id]:self._offsets_view[vertex_id + 1]]
+
+    def _compact(self) -> None:
+        """Merge self._pending and any vertices added since the last call into the CSR arrays.
+        """
+        n = len(self._items)
+        if not self._pending and len(self._offsets) == n + 1:
+            return
+
+        # Recover the existing edges (smaller id first) from the CSR arrays, then append the pending ones.
+        degrees = np.diff(self._offsets).astype(np.int64)
+        sources = np.repeat(np.arange(len(degrees), dtype=np.int64), degrees)
+        targets = self._neighbours.astype(np.int64)
+        keep = sources < targets
+        pending = np.array(sorted(self._pending), dtype=np.int64).reshape(-1, 2)
+        sources = np.concatenate([sources[keep], pending[:, 0]])
+        targets = np.concatenate([targets[keep], pending[:, 1]])
+        edges = np.unique(sources * n + targets)
+        sources, targets = edges // n, edges % n
+
+        # Store every edge in both directions, ordered by source and then by target.
+        all_sources = np.concatenate([sources, targets])
+        all_targets = np.concatenate([targets, sources])
+        order = np.lexsort((all_targets, all_sources))
+        self._neighbours = all_targets[order].astype(np.int32)
+        self._offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(all_sources, minlength=n), out=self._offsets[1:])
+        self._pending = set()
+        self._refresh_views()
+
+    def _refresh_views(self) -> None:
+        """Rebuild the memoryviews used to read self._offsets and self._neighbours from Python.
+        """
+        self._offsets_view = memoryview(self._offsets)
+        self._neighbour_view = memoryview(self._neighbours)
+
+
+class DistanceTable:
+    """A table of the distances between every pair of vertices of a graph, computed ahead of time.
+
+    Distances are stored as a square matrix of unsigned bytes, where self._distances[i, j] is the number of edges on
+    the shortest path between the vertices with ids i and j, or UNREACHABLE if there is no such path (or if the path
+    is longer than the max_depth the table was built with). The matrix can be saved with numpy and loaded back as a
+    read-only memory map, so only the rows that are actually looked up are ever read from disk.
+
+    Instance Attributes:
+        - UNREACHABLE: the value stored for pairs of vertices with no path (of at most max_depth edges) between them
+        - max_depth: the largest distance stored in the table, or None if every distance is stored
+        - _ids: maps each item to its integer id, i.e. its row and column in self._distances
+        - _items: maps each integer id back to its item
+        - _distances: the matrix of distances between vertices
+
+    Representation Invariants:
+        - self._distances.shape == (len(self._items), len(self._items))
+        - all(self._items[self._ids[item]] == item for item in self._ids)
+    """
+    UNREACHABLE = 255
+    max_depth: Optional[int]
+    _ids: dict[Any, int]
+    _items: list[Any]
+    _distances: np.ndarray
+
+    def __init__(self, items: list[Any], distances: np.ndarray, max_depth: Optional[int] = None) -> None:
+        """Initialize a table of the given distances, where distances[i, j] is the distance between items[i] and
+        items[j].
+
+        Preconditions:
+            - distances.shape == (len(items), len(items))
+            - distances.dtype == np.uint8
+        """
+        self.max_depth = max_depth
+        self._items = list(items)
+        self._ids = {item: i for i, item in enumerate(self._items)}
+        self._distances = distances
+
+    @classmethod
+    def from_graph(cls, graph: CompactGraph, max_depth: Optional[int] = None) -> DistanceTable:
+        """Return the table of distances between every pair of vertices of graph, found by running a breadth-first
+        search from every vertex. Distances greater than max_depth (if given) are stored as UNREACHABLE.
+
+        Preconditions:
+            - (graph.diameter() if max_depth is None else max_depth) < DistanceTable.UNREACHABLE
+        """
+        items = graph.items()
+        distances = np.full((len(items), len(items)), cls.UNREACHABLE, dtype=np.uint8)
+        for i, item in enumerate(items):
+            row = graph.distances_from(item, max_depth)
+            ids = [graph.vertex_id(other) for other in row]
+            distances[i, ids] = list(row.values())
+        return cls(items, distances, max_depth)
+
+    def save(self, matrix_file: str, vocabulary_file: str) -> None:
+        """Save this table as a .npy file holding the distance matrix and a JSON file holding the items (in id order)
+        and max_depth.
+
+        Preconditions:
+            - all(isinstance(item, str) for item in self._items)
+        """
+        np.save(matrix_file, self._distances)
+        with open(vocabulary_file, 'w') as f:
+            json.dump({'max_depth': self.max_depth, 'items': self._items}, f)
+
+    @classmethod
+    def load(cls, matrix_file: str, vocabulary_file: str) -> DistanceTable:
+        """Load a table saved by DistanceTable.save. The distance matrix is memory-mapped rather than read.
+        """
+        with open(vocabulary_file, 'r') as f:
+            vocabulary = json.load(f)
+        return cls(vocabulary['items'], np.load(matrix_file, mmap_mode='r'), vocabulary['max_depth'])
+
+    def distance(self, start: Any, end: Any, max_depth: Optional[int] = None) -> Optional[int]:
+        """Return the number of edges on the shortest path between the vertices with items start and end.
+        Return None if there is no such path, if it has more than max_depth edges (when given) or more than
+        self.max_depth edges, or if either item is not in this table.
+        """
+        if start in self._ids and end in self._ids:
+            return self._to_distance(int(self._distances[self._ids[start], self._ids[end]]), max_depth)
+        else:
+            return None
+
+    def nearest_distances(self, sources: Iterable, targets: Iterable,
+                          max_depth: Optional[int] = None) -> dict[Any, Optional[int]]:
+        """Return a dictionary mapping each item in sources to the number of edges between its vertex and the
+        nearest vertex whose item is in targets, with None for unreachable items, as in Graph.nearest_distances.
+        """
+        sources = list(sources)
+        source_ids = [self._ids[item] for item in sources if item in self._ids]
+        target_ids = [self._ids[item] for item in targets if item in self._ids]
+        if not source_ids or not target_ids:
+            return {item: None for item in sources}
+
+        nearest = self._distances[np.ix_(source_ids, target_ids)].min(axis=1).tolist()
+        found = dict(zip(source_ids, nearest))
+        return {item: self._to_distance(found[self._ids[item]], max_depth) if item in self._ids else None
+                for item in sources}
+
+    def _to_distance(self, stored: int, max_depth: Optional[int]) -> Optional[int]:
+        """Return the distance represented by the stored table value, or None if it is unreachable or more than
+        max_depth.
+        """
+        if stored == self.UNREACHABLE or (max_depth is not None and stored > max_depth):
+            return None
+        else:
+            return stored
+
+
+class LandmarkOracle:
+    """An approximate distance oracle for a CompactGraph, based on the distances to a few landmark vertices.
+
+    For any landmark l, the triangle inequality gives |d(a, l) - d(b, l)| <= d(a, b) <= d(a, l) + d(l, b). The
+    oracle stores the distance from every landmark to every vertex, and estimates d(a, b) by the smallest of these
+    upper bounds, which takes O(k) time for k landmarks. The estimate is never below the true distance, and is exact
+    whenever some landmark lies on a shortest path between a and b. Pairs in a component without any landmark are
+    answered exactly by searching the graph, which is cheap since such components are small.
+
+    Instance Attributes:
+        - landmarks: the items of the landmark vertices
+        - _graph: the graph whose distances are estimated
+        - _labels: the component label of every vertex, indexed by vertex id
+        - _distances: a uint8 matrix where entry [i, j] is the distance from the i-th landmark to the vertex with id j,
+          or DistanceTable.UNREACHABLE if they are not connected
+
+    Representation Invariants:
+        - self._distances.shape == (len(self.landmarks), len(self._graph.items()))
+    """
+    landmarks: list[Any]
+    _graph: CompactGraph
+    _labels: np.ndarray
+    _distances: np.ndarray
+
+    def __init__(self, graph: CompactGraph, num_landmarks: int = 16) -> None:
+        """Initialize an oracle for graph with (up to) num_landmarks landmarks.
+
+        Landmarks are picked in decreasing order of degree, skipping any vertex adjacent to an earlier landmark so
+        that they spread out over the graph. The distances from all landmarks are then found at once with
+        CompactGraph.batch_distances.
+
+        Preconditions:
+            - num_landmarks >= 1
+        """
+        self._graph = graph
+        items = graph.items()
+        neighbour_map = graph.get_neighbour_map()
+        self.landmarks = []
+        covered = set()
+        for item in sorted(items, key=lambda x: len(neighbour_map[x]), reverse=True):
+            if len(self.landmarks) == num_landmarks or not neighbour_map[item]:
+                break
+            if item not in covered:
+                self.landmarks.append(item)
+                covered.update(neighbour_map[item])
+        self._labels = np.array([graph.component(item) for item in items], dtype=np.int64)
+        self._distances = graph.batch_distances(self.landmarks).astype(np.int16)
+        self._distances[self._distances == DistanceTable.UNREACHABLE] = _NO_BOUND
+
+    def bounds(self, start: Any, end: Any) -> Optional[tuple[int, int]]:
+        """Return the best lower and upper bounds on the distance between the vertices with items start and end
+        given by the landmarks, or None if start and end are not connected, if either does not appear as a vertex
+        in the graph, or if no landmark is connected to them.
+        """
+        if not self._graph.connected(start, end):
+            return None
+        column1 = self._distances[:, self._graph.vertex_id(start)]
+        column2 = self._distances[:, self._graph.vertex_id(end)]
+        reachable = column1 < _NO_BOUND
+        if not reachable.any():
+            return None
+        column1, column2 = column1[reachable], column2[reachable]
+        return int(np.abs(column1 - column2).max()), int((column1 + column2).min())
+
+    def distance(self, start: Any, end: Any, max_depth: Optional[int] = None) -> Optional[int]:
+        """Return an estimate of the number of edges on the shortest path between the vertices with items start and
+        end, which is never less than the true distance. Return None if they are not connected, if either does not
+        appear as a vertex in the graph, or if the estimate is more than max_depth (when given).
+        """
+        if start == end:
+            return 0 if self._graph.vertex_id(start) is not None else None
+        bounds = self.bounds(start, end)
+        if bounds is None:
+            return self._graph.distance(start, end, max_depth)
+        elif max_depth is not None and bounds[1] > max_depth:
+            return None
+        else:
+            return bounds[1]
+
+    def nearest_distances(self, sources: Iterable, targets: Iterable,
+                          max_depth: Optional[int] = None) -> dict[Any, Optional[int]]:
+        """Return a dictionary mapping each item in sources to an estimate of the number of edges between its vertex
+        and the nearest vertex whose item is in targets, with None for unreachable items, as in
+        Graph.nearest_distances. Every estimate is at least the true distance.
+        """
+        sources = list(sources)
+        target_set = {item for item in targets if self._graph.vertex_id(item) is not None}
+        found = [item for item in sources if self._graph.vertex_id(item) is not None]
+        if not found or not target_set:
+            return {item: None for item in sources}
+        source_ids = np.array([self._graph.vertex_id(item) for item in found], dtype=np.int64)
+        target_ids = np.array([self._graph.vertex_id(item) for item in target_set], dtype=np.int64)
+
+        # upper[i, j] is the best landmark upper bound on the distance from the i-th found source to the j-th target,
+        # or at least _NO_BOUND if no landmark gives one.
+        upper = (self._distances[:, source_ids, np.newaxis] + self._distances[:, np.newaxis, target_ids]).min(axis=0)
+        same_component = self._labels[source_ids, np.newaxis] == self._labels[np.newaxis, target_ids]
+        upper[~same_component] = _NO_BOUND
+        estimates = dict(zip(found, upper.min(axis=1).tolist()))
+        connected = dict(zip(found, same_component.any(axis=1).tolist()))
+
+        # Sources that share a component with a target, but have no landmark in it, are searched exactly.
+        unbounded = [item for item in found if connected[item] and estimates[item] >= _NO_BOUND]
+        distances = self._graph.nearest_distances(unbounded, target_set, max_depth) if unbounded else {}
+        for item in sources:
+            if item in distances:
+                continue
+            elif item in target_set:
+                distances[item] = 0
+            elif item not in estimates or not connected[item] or \
+                    (max_depth is not None and estimates[item] > max_depth):
+                distances[item] = None
+            else:
+                distances[item] = estimates[item]
+        return distances
+
+
+class HopBitsetIndex:
+    """An index of the vertices within a few hops of every vertex of a CompactGraph, stored as bitsets.
+
+    Each bitset is a Python int in which bit j is set when the vertex with id j is included, so intersecting a
+    neighbourhood with a whole set of vertices is a single bitwise AND over machine words. The distance from a vertex
+    to the nearest vertex of a set S is then the smallest h such that the vertex's h-hop bitset meets the bitset of S.
+    Distances of more than max_hops edges are not stored, and are reported as None (i.e. unrelated).
+
+    Instance Attributes:
+        - max_hops: the largest distance stored in the index
+        - _ids: maps each item to its integer id, i.e. its bit position
+        - _within: _within[h][i] is the bitset of the vertices within h edges of the vertex with id i,
+          for 0 <= h <= max_hops
+
+    Representation Invariants:
+        - len(self._within) == self.max_hops + 1
+        - all(self._within[0][i] == 1 << i for i in range(len(self._ids)))
+    """
+    max_hops: int
+    _ids: dict[Any, int]
+    _within: list[list[int]]
+
+    def __init__(self, graph: CompactGraph, max_hops: int = 3) -> None:
+        """Initialize the index of the vertices within 1, 2, ..., max_hops edges of each vertex of graph.
+
+        The bitsets for h hops are built from those for h - 1 hops: a vertex is within h edges of v exactly when it
+        is within h - 1 edges of v or of one of v's neighbours.
+
+        Preconditions:
+            - max_hops >= 0
+        """
+        self.max_hops = max_hops
+        items = graph.items()
+        self._ids = {item: i for i, item in enumerate(items)}
+        neighbour_map = graph.get_neighbour_map()
+        neighbour_ids = [[self._ids[neighbour] for neighbour in neighbour_map[item]] for item in items]
+
+        self._within = [[1 << i for i in range(len(items))]]
+        for _ in range(max_hops):
+            previous = self._within[-1]
+            current = []
+            for i, neighbours in enumerate(neighbour_ids):
+                bitset = previous[i]
+                for neighbour in neighbours:
+                    bitset |= previous[neighbour]
+                current.append(bitset)
+            self._within.append(current)
+
+    def bitset(self, items: Iterable) -> int:
+        """Return the bitset of the vertices whose items are in items. Items that are not vertices are ignored.
+        """
+        bitset = 0
+        for item in items:
+            if item in self._ids:
+                bitset |= 1 << self._ids[item]
+        return bitset
+
+    def distance_to_bitset(self, item: Any, bitset: int, max_depth: Optional[int] = None) -> Optional[int]:
+        """Return the number of edges between the vertex with the given item and the nearest vertex in bitset, or
+        None if there is none within min(max_depth, self.max_hops) edges or item does not appear as a vertex.
+        """
+        if item not in self._ids:
+            return None
+        i = self._ids[item]
+        depth = self.max_hops if max_depth is None else min(max_depth, self.max_hops)
+        for hops in range(depth + 1):
+            if self._within[hops][i] & bitset:
+                return hops
+        return None
+
+    def distance(self, start: Any, end: Any, max_depth: Optional[int] = None) -> Optional[int]:
+        """Return the number of edges on the shortest path between the vertices with items start and end, or None if
+        it has more than min(max_depth, self.max_hops) edges or either item does not appear as a vertex.
+        """
+        if end in self._ids:
+            return self.distance_to_bitset(start, 1 << self._ids[end], max_depth)
+        else:
+            return None
+
+    def nearest_distances(self, sources: Iterable, targets: Iterable,
+                          max_depth: Optional[int] = None) -> dict[Any, Optional[int]]:
+        """Return a dictionary mapping each item in sources to the number of edges between its vertex and the
+        nearest vertex whose item is in targets, with None for unreachable items and items more than
+        min(max_depth, self.max_hops) edges away, as in Graph.nearest_distances.
+        """
+        bitset = self.bitset(targets)
+        return {item: self.distance_to_bitset(item, bitset, max_depth) for item in sources}
+
+
+# The stand-in for DistanceTable.UNREACHABLE in the landmark distances of a LandmarkOracle. It is large enough that
+# any bound using an unreachable landmark is never chosen over a real one.
+_NO_BOUND = 1 << 12
+
+# Any of these can be used wherever keyword distances are needed, such as in recommendation_algorithm.Media.
+DistanceSource = Union[Graph, CompactGraph, DistanceTable, LandmarkOracle, HopBitsetIndex]
+
+
+def _vertex_neighbours(vertex: _Vertex) -> set[_Vertex]:
+    """Return the neighbours of vertex. Used as the neighbour function when searching a Graph.
+    """
+    return vertex.neighbours
+
+
+def _bidirectional_search(source: Any, target: Any, neighbours_of: Callable[[Any], Iterable],
+                          max_depth: Optional[int] = None) -> Optional[tuple[int, Any, dict, dict]]:
+    """Run a breadth-first search from source and from target at the same time, where neighbours_of(node) returns the
+    neighbours of node.
+
+    Return None if source and target are not connected, or if max_depth is not None and the shortest path between
+    them has more than max_depth edges. Otherwise, return a tuple of the number of edges on the
+    shortest path, the node where the two searches met, and the parent dictionaries of the forward and backward
+    searches (each mapping a node to the node it was reached from, or None for source and target).
+
+    Process:
+        - Keep one frontier (a deque) for each side, and always expand the smaller one by a whole level.
+        - Stop as soon as a newly reached node has already been reached by the other side.
+
+    Intuition:
+        - Since each side is expanded one whole level at a time, the first node reached by both searches lies on a
+        shortest path. Expanding the smaller frontier keeps the number of visited nodes far below that of a
+        one-sided search.
+    """
+    parents = ({source: None}, {target: None})
+    if source == target:
+        return 0, source, parents[0], parents[1]
+
+    frontiers = (deque([source]), deque([target]))
+    depth = 0  # The sum of the depths searched so far by both sides.
+    while frontiers[0] and frontiers[1] and (max_depth is None or depth < max_depth):
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        frontier, own, other = frontiers[side], parents[side], parents[1 - side]
+        for _ in range(len(frontier)):
+            node = frontier.popleft()
+            for neighbour in neighbours_of(node):
+                if neighbour not in own:
+                    own[neighbour] = node
+                    if neighbour in other:
+                        return depth + 1, neighbour, parents[0], parents[1]
+                    frontier.append(neighbour)
+        depth += 1
+    return None
+
+
+def _breadth_first_distances(sources: Iterable, neighbours_of: Callable[[Any], Iterable],
+                             max_depth: Optional[int] = None) -> dict[Any, int]:
+    """Return a dictionary mapping every node within max_depth edges of a node in sources (or every node connected
+    to one, if max_depth is None) to its distance from the nearest node in sources, where neighbours_of(node)
+    returns the neighbours of node.
+    """
+    distances = {source: 0 for source in sources}
+    frontier = deque(distances)
+    while frontier:
+        node = frontier.popleft()
+        depth = distances[node] + 1
+        if max_depth is not None and depth > max_depth:
+            break
+        for neighbour in neighbours_of(node):
+            if neighbour not in distances:
+                distances[neighbour] = depth
+                frontier.append(neighbour)
+    return distances
+
+
+def _nearest_distances(sources: list, targets: list, neighbours_of: Callable[[Any], Iterable],
+                       component_of: Callable[[Any], Any], max_depth: Optional[int] = None) -> dict[Any, int]:
+    """Return a dictionary mapping each node in sources that is connected to a node in targets (within max_depth
+    edges, if max_depth is given) to its distance from the nearest such target, where neighbours_of(node) returns
+    the neighbours of node and component_of(node) returns the label of its connected component.
+
+    Process:
+        - Drop the sources and targets that share no component with the other side; they can never meet.
+        - Run one breadth-first search seeded with every remaining target at once.
+        - Stop as soon as every remaining source has been reached.
+    """
+    source_components = {component_of(node) for node in sources}
+    seeds = [node for node in targets if component_of(node) in source_components]
+    target_components = {component_of(node) for node in seeds}
+    remaining = {node for node in sources if component_of(node) in target_components}
+
+    distances = {}
+    for node in seeds:
+        distances[node] = 0
+        remaining.discard(node)
+    frontier = deque(distances)
+    while frontier and remaining:
+        node = frontier.popleft()
+        depth = distances[node] + 1
+        if max_depth is not None and depth > max_depth:
+            break
+        for neighbour in neighbours_of(node):
+            if neighbour not in distances:
+                distances[neighbour] = depth
+                remaining.discard(neighbour)
+                frontier.append(neighbour)
+    return {node: distances[node] for node in sources if node in distances}
+
+
+def _cached_nearest_distances(sources: list, targets: list, neighbours_of: Callable[[Any], Iterable],
+                              component_of: Callable[[Any], Any], id_of: Callable[[Any], int],
+                              cache: KeywordPairCache, max_depth: Optional[int] = None) -> dict[Any, int]:
+    """Return the same dictionary as _nearest_distances, where id_of(node) returns the id of node in cache.
+
+    Process:
+        - Look up the distance from each source to every target in its component in the cache.
+        - Find the distances of all the missing pairs with one breadth-first search seeded with every source that
+        has any (see _search_pairs), and store them (None for pairs it did not connect) in the cache.
+        - Each source's distance is the smallest distance to any of the targets.
+    """
+    targets_by_component = {}
+    for node in targets:
+        targets_by_component.setdefault(component_of(node), []).append(node)
+
+    nearest = {}
+    missing = {}
+    for source in sources:
+        for target in targets_by_component.get(component_of(source), []):
+            found, distance = cache.lookup(id_of(source), id_of(target), max_depth)
+            if not found:
+                missing.setdefault(source, []).append(target)
+            elif distance is not None and (source not in nearest or distance < nearest[source]):
+                nearest[source] = distance
+
+    if missing:
+        reached = _search_pairs(missing, neighbours_of, max_depth)
+        for source, source_missing in missing.items():
+            for target in source_missing:
+                distance = reached.get((source, target))
+                cache.store(id_of(source), id_of(target), max_depth, distance)
+                if distance is not None and (source not in nearest or distance < nearest[source]):
+                    nearest[source] = distance
+    return nearest
+
+
+def _search_pairs(wanted: dict[Any, list], neighbours_of: Callable[[Any], Iterable],
+                  max_depth: Optional[int] = None) -> dict[tuple[Any, Any], int]:
+    """Return a dictionary mapping each pair (source, target), for every source in wanted and target in
+    wanted[source], to the distance between them, for the pairs within max_depth edges of each other (or connected,
+    if max_depth is None).
+
+    Process:
+        - Give each source its own bit, and run a single breadth-first search seeded with every source at once, in
+        which each node records the bits of the sources that have reached it.
+        - Expand each node of a level once, passing on all the bits that reached it at that level together, so
+        that the sources share the work of exploring the parts of the graph they have in common instead of each
+        walking them on its own.
+        - Stop as soon as every wanted target has been reached by every source that wants it.
+    """
+    bit_sources = list(wanted)
+    wanting = {}  # Maps each target to the bits of the sources that want it and have not reached it yet
+    for bit, source in enumerate(bit_sources):
+        for target in wanted[source]:
+            wanting[target] = wanting.get(target, 0) | 1 << bit
+    frontier = {source: 1 << bit for bit, source in enumerate(bit_sources)}
+    seen = dict(frontier)
+    distances = {}
+    depth = 0
+    while True:
+        for node in wanting.keys() & frontier.keys():
+            reached = wanting[node] & frontier[node]
+            while reached:
+                lowest = reached & -reached
+                distances[(bit_sources[lowest.bit_length() - 1], node)] = depth
+                reached ^= lowest
+            wanting[node] &= ~frontier[node]
+            if not wanting[node]:
+                del wanting[node]
+        depth += 1
+        if not wanting or not frontier or (max_depth is not None and depth > max_depth):
+            return distances
+        next_frontier = {}
+        for node, bits in frontier.items():
+            for neighbour in neighbours_of(node):
+                new_bits = bits & ~seen.get(neighbour, 0)
+                if new_bits:
+                    seen[neighbour] = seen.get(neighbour, 0) | new_bits
+                    next_frontier[neighbour] = next_frontier.get(neighbour, 0) | new_bits
+        frontier = next_frontier
+
+
+def _join_path(meeting: Any, forward: dict, backward: dict) -> list:
+    """Return the path through meeting described by the parent dictionaries of a _bidirectional_search.
+    """
+    path = []
+    node = meeting
+    while node is not None:
+        path.append(node)
+        node = forward[node]
+    path.reverse()
+    node = backward[meeting]
+    while node is not None:
+        path.append(node)
+        node = backward[node]
+    return path
+
 
 if __name__ == '__main__':
 
@@ -218,8 +1365,9 @@ if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['queue'],
-        'allowed-io': [''],
+        'extra-imports': ['typing', 'bisect', 'json', 'mmap', 'os', 'struct', 'collections', 'numpy'],
+        'allowed-io': ['CompactGraph.from_snapshot', 'CompactGraph.write_snapshot', 'DistanceTable.save',
+                       'DistanceTable.load'],
         'disable': [''],
         'max-nested-blocks': 4,
         'max-line-length': 120,
@@ -0,0 +1,182 @@
+"""CSC111 Course Project: gui_snapshot.py
+
+Module description
+===============================
+
+This Python module is responsible for the snapshot of everything the GUI needs before its window can appear: the
+type (movie or show) of every title the user can search for, where the record of each title is in its filtered IMDB
+dataset, every genre that can be whitelisted, and the image URL of every anime. Building these means parsing both
+filtered IMDB datasets and streaming the raw anime list, so the snapshot is built offline by running this file, and
+main.py loads it with a single read. The record of a title is only read from its dataset once the title is submitted.
+
+If the snapshot is missing or older than any file it is built from, it is built again when it is loaded (without
+being written), which is as slow as the GUI used to start.
+
+This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
+"""
+from __future__ import annotations
+import csv
+import json
+import os
+
+GUI_SNAPSHOT_FILE = 'datasets/filtered/gui_snapshot.json'
+
+# The filtered dataset of each type of title the user can search for.
+MEDIA_FILES = {'Movie': 'datasets/filtered/final_imdb_movies.json', 'Show': 'datasets/filtered/final_imdb_shows.json'}
+
+# The raw anime dataset whose image paths the anime image URLs are made from.
+ANIME_IMAGES_FILE = 'datasets/raw/AnimeList.csv'
+
+
+class GuiSnapshot:
+    """The titles, genres and images shown by the GUI, and where the record of each title is.
+
+    Instance Attributes:
+        - titles: maps every movie and show title to its type, either 'Movie' or 'Show'
+        - offsets: maps every title to the byte offsets of the start and end of its record in MEDIA_FILES[its type]
+        - genres: every genre that can be whitelisted
+        - images: maps the title of every anime to the URL of its image
+
+    Representation Invariants:
+        - self.titles.keys() == self.offsets.keys()
+        - all(self.titles[title] in MEDIA_FILES for title in self.titles)
+        - all(start < stop for start, stop in self.offsets.values())
+    """
+    titles: dict[str, str]
+    offsets: dict[str, tuple[int, int]]
+    genres: set[str]
+    images: dict[str, str]
+
+    def __init__(self, titles: dict[str, str], offsets: dict[str, tuple[int, int]], genres: set[str],
+                 images: dict[str, str]) -> None:
+        """Initialize a snapshot with the given attributes."""
+        self.titles = titles
+        self.offsets = offsets
+        self.genres = genres
+        self.images = images
+
+    def entry(self, title: str) -> dict:
+        """Return the dataset entry of title, read from its record in its filtered dataset.
+
+        Preconditions:
+            - title in self.titles
+        """
+        start, stop = self.offsets[title]
+        with open(MEDIA_FILES[self.titles[title]], 'rb') as file:
+            file.seek(start)
+            return json.loads(file.read(stop - start))
+
+    def write(self, filename: str = GUI_SNAPSHOT_FILE) -> None:
+        """Write this snapshot to filename, to be loaded with load_gui_snapshot.
+
+        The file is written under a temporary name and then moved into place, so that a GUI starting meanwhile never
+        reads a partly written snapshot.
+        """
+        temporary_file = f'{filename}.{os.getpid()}.tmp'
+        with open(temporary_file, 'w') as file:
+            json.dump({'titles': self.titles, 'offsets': self.offsets, 'genres': sorted(self.genres),
+                       'images': self.images}, file)
+        os.replace(temporary_file, filename)
+
+
+def load_gui_snapshot(filename: str = GUI_SNAPSHOT_FILE) -> GuiSnapshot:
+    """Return the snapshot stored in filename, or a newly built one if filename does not exist or is older than any
+    file the snapshot is built from.
+    """
+    if not is_up_to_date(filename):
+        return build_gui_snapshot()
+    with open(filename, 'r') as file:
+        snapshot = json.load(file)
+    offsets = {title: (start, stop) for title, (start, stop) in snapshot['offsets'].items()}
+    return GuiSnapshot(snapshot['titles'], offsets, set(snapshot['genres']), snapshot['images'])
+
+
+def is_up_to_date(filename: str = GUI_SNAPSHOT_FILE) -> bool:
+    """Return whether the snapshot file filename exists and is at least as new as every file it is built from.
+    """
+    return os.path.exists(filename) and all(os.path.getmtime(filename) >= os.path.getmtime(source)
+                                            for source in _source_files() if os.path.exists(source))
+
+
+def build_gui_snapshot() -> GuiSnapshot:
+    """Return the snapshot of the files in MEDIA_FILES and ANIME_IMAGES_FILE.
+
+    A title in both the movies and the shows datasets is taken to be a show, as the GUI has always done.
+    """
+    titles = {}
+    offsets = {}
+    genres = set()
+    for media_type, filename in MEDIA_FILES.items():
+        for title, record_offsets, entry in extract_records(filename):
+            titles[title] = media_type
+            offsets[title] = record_offsets
+            if media_type == 'Show':  # The genres of the shows are the ones the anime dataset was labelled with
+                genres.update(entry['genre'].split(', '))
+    return GuiSnapshot(titles, offsets, genres, extract_images_file())
+
+
+def extract_records(filename: str) -> list[tuple[str, tuple[int, int], dict]]:
+    """Return the title, the byte offsets of the start and end of the record, and the entry of every record in the
+    filtered dataset filename, in the order of the file.
+
+    Preconditions:
+        - filename is the path of a readable JSON file holding a list of entries, each with a 'title'
+    """
+    with open(filename, 'rb') as file:
+        text = file.read().decode('utf-8')
+    decoder = json.JSONDecoder()
+    records = []
+    # Positions in text are counted in characters, and those of the file in bytes, which differ past any non-ASCII
+    # character, so the byte position is advanced along with the character position.
+    position = text.index('[') + 1
+    byte_position = len(text[:position].encode('utf-8'))
+    while True:
+        start = position
+        while text[position] in ' \t\r\n,':
+            position += 1
+        if text[position] == ']':
+            return records
+        byte_position += len(text[start:position].encode('utf-8'))
+        entry, end = decoder.raw_decode(text, position)
+        record_length = len(text[position:end].encode('utf-8'))
+        records.append((entry['title'], (byte_position, byte_position + record_length), entry))
+        position, byte_position = end, byte_position + record_length
+
+
+def extract_images_file() -> dict[str, str]:
+    """Extracting images for animes through the AnimeList.csv dataset.
+    Manipulates the invalid image URLs into valid (working) ones
+    """
+    images = {}
+
+    with open(ANIME_IMAGES_FILE, 'r', encoding='utf-8') as file:
+        reader = csv.reader(file)
+
+        next(reader)
+
+        for row in reader:
+            # Loop Invariant:
+            assert row[5] == '' or row[5].find('anime/') == 40  # row[5] is not an empty str ==> index is 40
+
+            images[row[1]] = 'https://cdn.myanimelist.net/images/anime/' + row[5][46:]
+
+    return images
+
+
+def _source_files() -> list[str]:
+    """Return the names of the files the snapshot is built from."""
+    return list(MEDIA_FILES.values()) + [ANIME_IMAGES_FILE]
+
+
+if __name__ == '__main__':
+    build_gui_snapshot().write()
+
+    # Enabling python_ta configurations:
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['csv', 'json', 'os'],
+        'allowed-io': ['GuiSnapshot.entry', 'GuiSnapshot.write', 'load_gui_snapshot', 'extract_records',
+                       'extract_images_file'],
+        'max-line-length': 120,
+    })
@@ -22,6 +22,8 @@ from nltk.corpus import wordnet as wn, stopwords
 import spacy
 from spacy import tokens
 
+import recommendation_algorithm
+
 # import ssl
 
 # try:
@@ -200,6 +202,18 @@ def write_edges(edge_file: str, tokenized_list: list, length: int, threshold: fl
         f.write('\n' + str(connections))
 
 
+def write_graph_snapshot(keyword_file: str, snapshot_file: str) -> None:
+    """Compiles the keyword vertices and edges in keyword_file into a binary snapshot (see
+    graph_classes.CompactGraph.write_snapshot) written to snapshot_file. recommendation_algorithm loads this snapshot
+    instead of parsing keyword_file whenever the snapshot is up to date.
+
+    Preconditions:
+        - keyword_file is a name of a txt file whose first line is a set of keywords and second line is a set of edges
+    """
+    keyword_graph = recommendation_algorithm.build_keyword_graph_from_file(compact=True, keyword_file=keyword_file)
+    keyword_graph.write_snapshot(snapshot_file)
+
+
 def update_dataset_keywords(reference_file: str, edit_file: str, column: str) -> None:
     """Only to be run after the keyword_graph.txt file has at least the first line completed
     i.e. write_keywords() has been called. Updates IMDb movie and TV show databases with keywords found.
@@ -253,11 +267,14 @@ if __name__ == '__main__':
     # Run this line next. Creates and stores keyword edges in keyword_graph.txt.
     # write_edges('datasets/filtered/keyword_graph.txt', keyword_set, num_keywords, 0.65, (0, num_keywords))
 
+    # Run this line last. Compiles keyword_graph.txt into the binary snapshot loaded by recommendation_algorithm.py.
+    # write_graph_snapshot('datasets/filtered/keyword_graph.txt', 'datasets/filtered/keyword_graph.bin')
+
     # Enable python_ta configurations:
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ["pandas", "json", "nltk", "spacy", "nltk.stem", "nltk.corpus"],
+        'extra-imports': ["pandas", "json", "nltk", "spacy", "nltk.stem", "nltk.corpus", "recommendation_algorithm"],
         'allowed-io': ["get_imdb_keywords", "get_keywords_from_file", "write_keywords", "write_edges",
                        "write_dataset_keywords", "update_dataset_keywords"],
         'disable': ['E1101', 'F0002'],
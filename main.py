@@ -13,19 +13,17 @@ This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz J
 """
 from __future__ import annotations
 
-import csv
+from typing import Callable, Optional
 
-from typing import Optional
-
-import json
 import random
 import os
 import sys
+import threading
 
 import requests  # You must have an internet connection
 
 import python_ta
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt6.QtWidgets import (
     QWidget, QGroupBox, QFormLayout, QHBoxLayout, QVBoxLayout, QLabel, QPushButton,
     QMainWindow, QLineEdit, QCompleter, QScrollArea, QSpacerItem, QSizePolicy, QApplication
@@ -34,130 +32,34 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import QFont, QPixmap, QImage
 from PyQt6 import QtCore
 from recommendation_algorithm import Media
-import graph_classes
 import recommendation_algorithm
-import filter_movies
-import anime_filter
+import gui_snapshot
+import result_cache
+import scoring_engine
 
 # Picks a random background image at the start of the program and excludes the .DS_Store path.
 BACKGROUND_IMAGE = \
     f"imgs/background_images/{random.choice([x for x in os.listdir('imgs/background_images') if x[0] != '.'])}"
-ALL_GENRES = anime_filter.get_genres()
-
+# Recommendations made for past queries, so that resubmitting the same query does not score the catalog again.
+RESULT_CACHE = result_cache.ResultCache()
 
-def build_keyword_graph_from_file() -> graph_classes.Graph:
-    """Makes the graph to be used in the keywords assessment"""
-    with open('datasets/filtered/keyword_graph.txt', 'r') as f:
-        lines = f.readlines()
-    keyword_graph = graph_classes.Graph()
-    edges = eval(lines[1])
-    vertices = eval(lines[0])
-    for vertex in vertices:
-        keyword_graph.add_vertex(vertex)
-    keyword_graph.add_all_edges(edges)
-    return keyword_graph
 
-
-def modified_get_recommendations(input_set: list[tuple[dict, str]], num_rec: int, rating: float, genres: set[str]) -> \
+def modified_get_recommendations(input_set: list[tuple[dict, str]], num_rec: int, rating: float, genres: set[str],
+                                 progress: Optional[scoring_engine.ProgressHook] = None,
+                                 cancelled: Optional[Callable[[], bool]] = None) -> \
         list[recommendation_algorithm.Media]:
     """
-    Generates a list of anime recommendations for the user.
+    Generates a list of anime recommendations for the user, from the best to the worst match.
+    (See scoring_engine.get_recommendations, including its progress and cancelled hooks.) Recommendations for a query
+    made before are reused from RESULT_CACHE.
 
     Preconditions:
     - every dict in the input_set is a valid entry format (json entry, form)
     """
-    anime_list = filter_movies.load_json_file_animes('datasets/filtered/final_animes.json')
-    anime_list = (anime_list, anime_list.copy())
-
-    for anime in anime_list[0]:
-        if float(anime['rating']) < rating or not all(genre in anime['genre'] for genre in genres):
-            anime_list[1].remove(anime)
-
-    anime_list = anime_list[1]
-
-    anime_media_list = []
-    input_media_set = set()
-    keyword_graph = build_keyword_graph_from_file()
-    for item in input_set:
-        input_media_set.add(recommendation_algorithm.Media(item[0], item[1]))
-
-    count = 0
-    for anime in anime_list:
-        anime_media = recommendation_algorithm.Media(anime, 'anime')
-        rec_score = 0
-        full_score = 0
-        for item in input_media_set:
-            sim_score = anime_media.compare(item, input_media_set, keyword_graph)
-            if anime_media.type == 'movie':
-                sim_score /= 2
-                full_score += 0.5
-            else:
-                full_score += 1
-            rec_score += sim_score
-        rec_score /= full_score
-        anime_media.recommendation['thing'] = (rec_score, input_media_set)
-        anime_media_list.append(anime_media)
-        # print(count + 1)
-        count += 1
-        # if count == 10:  # Remove during actual submission
-        #     break
-
-    anime_media_list.sort(key=lambda anime: get_anime_rec_score(anime, input_media_set))
-    if num_rec <= len(anime_media_list):  # uhhhh what?
-        return anime_media_list[0:num_rec]
-    else:
-        return anime_media_list  # i edited this cause otherwise it's gonna put the ENTIRE anime list
-
-
-def get_anime_rec_score(anime: recommendation_algorithm.Media, input_set: set[recommendation_algorithm.Media]) -> float:
-    """Used for sorting the finalized anime list"""
-    for recommendation in anime.recommendation:
-        if input_set in anime.recommendation[recommendation]:
-            return anime.recommendation[recommendation][0]  # this should be the rec_score
-
-    return 0.0  # This should never run though bc we are certain the if condition in the loop will execute once.
-
-
-def extract_movies_file(filename: str) -> tuple[dict[str, str], dict[str, dict]]:
-    """Helper function associated with extracting movies and shows from the final IMDB files in the filtered datasets.
-
-    Preconditions:
-    - filename is the path of a valid readable JSON file
-    """
-    names = {}
-    json_lines = {}
-
-    with open(filename, 'r') as f:
-        string = f.read()
-        for line in json.loads(string):
-            if 'movie' in filename:
-                names[line['title']] = 'Movie'
-                json_lines[line['title']] = line
-            elif 'show' in filename:
-                names[line['title']] = 'Show'
-                json_lines[line['title']] = line
-
-    return names, json_lines
-
-
-def extract_images_file() -> dict[str, str]:
-    """Extracting images for animes through the AnimeList.csv dataset.
-    Manipulates the invalid image URLs into valid (working) ones
-    """
-    images = {}
-
-    with open('datasets/raw/AnimeList.csv', 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-
-        next(reader)
-
-        for row in reader:
-            # Loop Invariant:
-            assert row[5] == '' or row[5].find('anime/') == 40  # row[5] is not an empty str ==> index is 40
-
-            images[row[1]] = 'https://cdn.myanimelist.net/images/anime/' + row[5][46:]
-
-    return images
+    # The catalog is scored in this process only: worker processes would be forked from a pool thread of a running Qt
+    # application, which is unsafe, and spawned ones would import this file again, which opens the GUI.
+    return result_cache.get_recommendations(input_set, num_rec, rating, genres, RESULT_CACHE, workers=1,
+                                            progress=progress, cancelled=cancelled)
 
 
 class AnimeWidget(QWidget):
@@ -426,7 +328,7 @@ class GenreWidget(ListWidgetTemplate):
         """The initializer to create an object.
 
         Preconditions:
-        - name in ALL_GENRES
+        - name in parent.genres
         """
         super().__init__(name, parent)
         self.layout.addWidget(self.close_button)
@@ -439,6 +341,87 @@ class GenreWidget(ListWidgetTemplate):
         self.layout.removeWidget(self)
 
 
+class RecommendationSignals(QObject):
+    """The signals a RecommendationJob sends from its worker thread to the GUI thread.
+
+    Instance Attributes:
+    - progress: Emitted with the job id, the work done, the total work and the best (score, anime title) pairs so far.
+    - finished: Emitted with the job id and the recommended animes, from the best to the worst match.
+    - failed: Emitted with the job id and a description of the error that stopped the job.
+    - stopped: Emitted with the job id once the job has stopped, whether it finished, failed or was cancelled.
+    """
+    progress = pyqtSignal(int, int, int, object)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    stopped = pyqtSignal(int)
+
+
+class RecommendationJob(QRunnable):
+    """A job that generates recommendations on a thread of a QThreadPool, so that the window stays responsive while
+    the catalog is scored.
+
+    Instance Attributes:
+    - job_id: A number identifying this job, sent with each of its signals so that those of stale jobs can be ignored.
+    - input_set: The (json entry, form) pairs of the movies and shows the user has watched.
+    - num_rec: The number of animes to recommend.
+    - rating: The minimum rating of the recommended animes.
+    - genres: The genres every recommended anime must have.
+    - signals: The signals this job emits.
+    - _cancelled: Set once the job is cancelled, which stops its scoring at the next check.
+
+    Representation Invariants:
+    - self.num_rec >= 0
+    """
+    job_id: int
+    input_set: list[tuple[dict, str]]
+    num_rec: int
+    rating: float
+    genres: set[str]
+    signals: RecommendationSignals
+    _cancelled: threading.Event
+
+    def __init__(self, job_id: int, input_set: list[tuple[dict, str]], num_rec: int, rating: float,
+                 genres: set[str]) -> None:
+        """Initializes the job. It must be made on the GUI thread, so that its signals are delivered there.
+
+        Preconditions:
+        - every dict in the input_set is a valid entry format (json entry, form)
+        """
+        super().__init__()
+        self.setAutoDelete(False)  # The window keeps the job until it stops, so Python rather than the pool owns it
+        self.job_id = job_id
+        self.input_set = input_set
+        self.num_rec = num_rec
+        self.rating = rating
+        self.genres = set(genres)
+        self.signals = RecommendationSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Stops the job as soon as possible. A cancelled job emits no more signals other than stopped."""
+        self._cancelled.set()
+
+    def run(self) -> None:
+        """Generates the recommendations. This runs on a thread of the pool."""
+        try:
+            recommendations = modified_get_recommendations(self.input_set, self.num_rec, self.rating, self.genres,
+                                                           progress=self.report_progress,
+                                                           cancelled=self._cancelled.is_set)
+            if not self._cancelled.is_set():
+                self.signals.finished.emit(self.job_id, recommendations)
+        except scoring_engine.ScoringCancelled:
+            pass
+        except Exception as error:  # Shown to the user, as an error on a worker thread would otherwise be lost
+            self.signals.failed.emit(self.job_id, repr(error))
+        finally:
+            self.signals.stopped.emit(self.job_id)
+
+    def report_progress(self, done: int, total: int, best: list[tuple[float, Media]]) -> None:
+        """Emits the progress of the job, with the titles of the best animes so far (rather than the animes, which
+        belong to the catalog shared with other threads)."""
+        self.signals.progress.emit(self.job_id, done, total, [(score, anime.title) for score, anime in best])
+
+
 class MainWindow(QMainWindow):
     """Main window for the application.
 
@@ -448,12 +431,19 @@ class MainWindow(QMainWindow):
     - container: A container that aids with the layout.
     - container_layout: A layout that organizes the positions of its children widgets.
     - form_layout: A layout used for adding multiple elements on a single horizontal row.
-    - json_movies: A dictionary that holds each movie entry from its filtered dataset.
+    - genres: A set of every genre that can be whitelisted.
+    - job: The RecommendationJob generating (or waiting to generate) the recommendations, or None if there is none.
+    - jobs_started: The number of RecommendationJobs started, used to give each one its id.
     - movies: A dict of all the movies extracted from the dataset.
     - movie_images: The images of all the animes as extracted from the dataset.
+    - progress_label: A QLabel showing the progress of the running job and the best animes it has found so far.
     - recommended_animes: A dictionary holding every AnimeWidget and its associated key (the anime name)
     - recommendation_box: A QGroupBox that stores holds all the AnimeWidgets.
     - scroll: A scroll object used to scroll through the recommendation_box when it gets too large.
+    - stale_jobs: The cancelled RecommendationJobs that are still running, by their ids. They are kept until they stop,
+    as the pool running them does not own them.
+    - snapshot: The GUI snapshot (see gui_snapshot.py) that the movies, genres and images are loaded from, and that
+    locates the dataset entry of each movie.
     - searchbar: A QLineEdit object used for the user to search up movies/shows.
     - settings: A list that holds customizable objects for the user to fine-tune their recommendation search. It
     contains the rating_text_object, a float of the minimum rating, select_rating_button, num_animes_text object, an int
@@ -464,20 +454,28 @@ class MainWindow(QMainWindow):
     - every movie in self.movies is from the filtered dataset.
     - every image in self.movie_images is a url (that can be manipulated).
     - self.added_movies contains movies and shows from the filtered dataset.
-    - every dict in json_movies corresponds to a dict in one of the final IMDB movies/shows filtered datasets.
+    - self.movies.keys() == self.snapshot.titles.keys()
+    - self.job is None or self.job.job_id not in self.stale_jobs
+    - self.job has been started in the pool exactly when self.stale_jobs == {}, as only one job at a time may use the
+    keyword pair cache of the catalog.
     """
     add_movie_button: QPushButton
     added_movies: set
     container: QWidget
     container_layout: QVBoxLayout
     form_layout: QFormLayout
-    json_movies: dict
+    genres: set[str]
+    job: Optional[RecommendationJob]
+    jobs_started: int
     movies: dict
     movie_images: dict[str, str]
+    progress_label: QLabel
     recommended_animes: dict
     recommendation_layout: QFormLayout
     recommendation_box: QGroupBox
     scroll: QScrollArea
+    snapshot: gui_snapshot.GuiSnapshot
+    stale_jobs: dict[int, RecommendationJob]
     searchbar: QLineEdit
     settings: list
     submit_button: QPushButton
@@ -504,15 +502,15 @@ class MainWindow(QMainWindow):
         ]
         self.scroll = QScrollArea()
         self.added_movies = set()
+        self.job = None
+        self.jobs_started = 0
+        self.stale_jobs = {}
+        self.progress_label = QLabel()
 
-        movie_names, json_lines = extract_movies_file('datasets/filtered/final_imdb_movies.json')
-        extracted_shows, json_shows = extract_movies_file('datasets/filtered/final_imdb_shows.json')
-        movie_names.update(extracted_shows)
-        json_lines.update(json_shows)
-
-        self.movies = movie_names
-        self.json_movies = json_lines
-        self.movie_images = extract_images_file()
+        self.snapshot = gui_snapshot.load_gui_snapshot()
+        self.movies = self.snapshot.titles
+        self.genres = self.snapshot.genres
+        self.movie_images = self.snapshot.images
 
         # To space the drop-down.
         spacer = QSpacerItem(10, 0, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
@@ -586,7 +584,7 @@ class MainWindow(QMainWindow):
         self.settings[9].setWidget(genres_box)
 
         # Genre auto-complete
-        genre_completer = QCompleter(ALL_GENRES)
+        genre_completer = QCompleter(sorted(self.genres))
         genre_completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
         self.settings[6].setCompleter(genre_completer)
 
@@ -653,7 +651,7 @@ class MainWindow(QMainWindow):
     def on_genre_added(self) -> None:
         """Button event for when genres are added"""
         text = self.settings[6].text()
-        if text in ALL_GENRES and text not in self.settings[7]:
+        if text in self.genres and text not in self.settings[7]:
             self.searchbar.setText('')
             self.settings[10].addRow(GenreWidget(text, self))
             self.settings[7].add(text)
@@ -695,8 +693,9 @@ class MainWindow(QMainWindow):
         """Button event that triggers recommendation generation
         when the user submits their list of movies/shows.
 
-        Preconditions:
-        - The amount of recommended animes returned != 0
+        The recommendations are generated by a RecommendationJob on a worker thread, which replaces (and cancels) any
+        job still running. It is started once the jobs it replaces have stopped. Its progress and the best animes
+        found so far are shown until it is done.
         """
         self.searchbar.hide()
         self.submit_button.hide()
@@ -705,7 +704,11 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.recommendation_box)
         self.recommendation_box.show()
 
-        lst = []
+        if self.job is not None:
+            self.stop_job()
+        while self.recommendation_layout.rowCount() > 0:
+            self.recommendation_layout.removeRow(0)
+        self.recommended_animes = {}
 
         if len(self.added_movies) == 0:
             self.recommendation_layout.setFormAlignment(Qt.AlignmentFlag.AlignHCenter)
@@ -715,28 +718,80 @@ class MainWindow(QMainWindow):
             )
             self.recommendation_layout.setFormAlignment(Qt.AlignmentFlag.AlignHCenter)
             self.recommendation_box.setAlignment(Qt.AlignmentFlag.AlignHCenter)
-        else:
-            # print('started')
-            lst = modified_get_recommendations(
-                [(self.json_movies[entry], self.movies[entry])
-                 for entry in self.json_movies if entry in self.added_movies],
-                self.settings[4],
-                self.settings[1],
-                self.settings[7]
-            )
-            # print('done')
+            return
+
+        self.jobs_started += 1
+        self.job = RecommendationJob(
+            self.jobs_started,
+            [(self.snapshot.entry(entry), self.movies[entry]) for entry in self.movies if entry in self.added_movies],
+            self.settings[4],
+            self.settings[1],
+            self.settings[7]
+        )
+        self.job.signals.progress.connect(self.on_recommendation_progress)
+        self.job.signals.finished.connect(self.on_recommendations_ready)
+        self.job.signals.failed.connect(self.on_recommendation_failed)
+        self.job.signals.stopped.connect(self.on_job_stopped)
+
+        self.progress_label = QLabel('Finding recommendations...')
+        self.recommendation_layout.addRow(self.progress_label)
+        if not self.stale_jobs:  # Otherwise, on_job_stopped starts the job once the stale jobs have stopped
+            QThreadPool.globalInstance().start(self.job)
+
+    def stop_job(self) -> None:
+        """Cancels the running job and forgets it. A job still waiting in the pool (or for stale jobs to stop) is
+        dropped, and one that is running is kept in self.stale_jobs until it stops.
+
+        Preconditions:
+        - self.job is not None
+        """
+        if self.stale_jobs == {} and not QThreadPool.globalInstance().tryTake(self.job):
+            self.job.cancel()
+            self.stale_jobs[self.job.job_id] = self.job
+        self.job = None
+
+    def on_job_stopped(self, job_id: int) -> None:
+        """Signal event for when a job has stopped, which starts the waiting job once no stale job is running."""
+        if self.stale_jobs.pop(job_id, None) is not None and not self.stale_jobs and self.job is not None:
+            QThreadPool.globalInstance().start(self.job)
+
+    def on_recommendation_progress(self, job_id: int, done: int, total: int, best: list[tuple[float, str]]) -> None:
+        """Signal event that shows the progress of a job and the best animes it has found so far."""
+        if self.job is None or job_id != self.job.job_id:
+            return
+        lines = [f'Scoring animes: {done} / {total}']
+        lines.extend(f'{i}) {title} ({score:.3f})' for i, (score, title) in enumerate(best, start=1))
+        self.progress_label.setText('\n'.join(lines))
+
+    def on_recommendation_failed(self, job_id: int, error: str) -> None:
+        """Signal event for when a job stops with an error."""
+        if self.job is None or job_id != self.job.job_id:
+            return
+        self.job = None
+        self.progress_label.setText(f'Could not generate recommendations: {error}')
+
+    def on_recommendations_ready(self, job_id: int, lst: list[Media]) -> None:
+        """Signal event that displays the recommendations of a finished job.
 
-            if len(lst) == 0:
-                self.recommendation_layout.setFormAlignment(Qt.AlignmentFlag.AlignHCenter)
-                self.recommendation_box.setAlignment(Qt.AlignmentFlag.AlignHCenter)
-                self.recommendation_layout.addRow(
-                    QLabel('No animes to recommend! Try lessening your filters for better results.')
-                )
-                self.recommendation_layout.setFormAlignment(Qt.AlignmentFlag.AlignHCenter)
-                self.recommendation_box.setAlignment(Qt.AlignmentFlag.AlignHCenter)
+        Preconditions:
+        - The amount of recommended animes returned != 0
+        """
+        if self.job is None or job_id != self.job.job_id:
+            return
+        self.job = None
+        self.recommendation_layout.removeRow(self.progress_label)
+
+        if len(lst) == 0:
+            self.recommendation_layout.setFormAlignment(Qt.AlignmentFlag.AlignHCenter)
+            self.recommendation_box.setAlignment(Qt.AlignmentFlag.AlignHCenter)
+            self.recommendation_layout.addRow(
+                QLabel('No animes to recommend! Try lessening your filters for better results.')
+            )
+            self.recommendation_layout.setFormAlignment(Qt.AlignmentFlag.AlignHCenter)
+            self.recommendation_box.setAlignment(Qt.AlignmentFlag.AlignHCenter)
 
         print('Recommended Shows:',
-              {anim.title: anim.__dict__ for anim in lst})
+              {anim.title: str(anim) for anim in lst})
         print('Movies/shows Added:', self.added_movies)
         print('Rating Filter:', self.settings[1])
         print('Number of Animes to Recommend:', self.settings[4])
@@ -771,6 +826,13 @@ class MainWindow(QMainWindow):
         # SELF REMINDER THAT I CAN USE A DICTIONARY/LIST TO STORE ALL THE WIDGETS AFTER THE RECOMMENDED
         # ANIMES ARE GENERATED, AND THEN KEEP IT AND THEN HIDE/SHOW AS USERS SCROLL THROUGH EACH ONE.
 
+    def closeEvent(self, event: QtCore.QEvent) -> None:
+        """Window event that cancels the running job when the window is closed, so that the program does not wait
+        for it to finish before exiting."""
+        if self.job is not None:
+            self.stop_job()
+        super().closeEvent(event)
+
 
 app = QApplication(sys.argv)
 
@@ -871,22 +933,19 @@ w.show()
 if __name__ == '__main__':
     python_ta.check_all(config={
         'extra-imports': [
-            'PyQt6', 'PyQt6.QtCore', 'PyQt6.QtWidgets', 'PyQt6.QtGui', 'Qt', 'os', 'sys', 'random', 'json', 'QWidget',
+            'PyQt6', 'PyQt6.QtCore', 'PyQt6.QtWidgets', 'PyQt6.QtGui', 'Qt', 'os', 'sys', 'random', 'QWidget',
             'QGroupBox', 'QFormLayout', 'QHBoxLayout', 'QVBoxLayout', 'QLabel', 'QPushButton', 'QMainWindow',
             'QLineEdit', 'QCompleter', 'QScrollArea', 'QFont', 'QPixmap', 'QtCore', 'recommendation_algorithm',
-            'Media', 'QSpacerItem', 'QSizePolicy', 'QApplication', 'requests', 'csv', 'graph_classes', 'filter_movies',
-            'anime_filter'
+            'Media', 'QSpacerItem', 'QSizePolicy', 'QApplication', 'requests', 'gui_snapshot', 'result_cache',
+            'scoring_engine', 'threading', 'typing', 'QObject', 'QRunnable', 'QThreadPool', 'pyqtSignal'
         ],
         # the names (strs) of imported modules
         'allowed-io': [
-            'extract_movies_file',
-            'extract_images_file',
             'modified_get_recommendations',
-            'MainWindow.on_submit',
-            'build_keyword_graph_from_file'
+            'MainWindow.on_recommendations_ready'
         ],
         # the names (strs) of functions that call print/open/input
-        'disable': ['E0611', 'E9992', 'E9997', 'R0902', 'W0123'],
+        'disable': ['E0611', 'E9992', 'E9997', 'R0902'],
         # Need E0611 and R0902 especially because of instance attributes
         'max-line-length': 120
     })
@@ -0,0 +1,47 @@
+"""CSC111 Course Project: python_ta_checks.py
+
+Module description
+===============================
+
+This Python module runs the python_ta checks of the modules whose main block runs a program that must not also run
+python_ta: recommend.py, whose output is read by other programs, and recommendation_server.py, which serves until it
+is stopped. Each other module runs its own checks in its main block. Run this file to check them:
+
+    python python_ta_checks.py
+
+This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
+"""
+import python_ta
+
+# The python_ta configuration of each module checked by this file.
+CHECKED_MODULES = {
+    'recommend.py': {
+        'extra-imports': ['typing', 'argparse', 'json', 'os', 'sys', 'gui_snapshot', 'result_cache', 'scoring_engine',
+                          'recommendation_algorithm'],
+        'allowed-io': ['read_query'],
+        'max-line-length': 120,
+    },
+    'recommendation_server.py': {
+        'extra-imports': ['typing', 'concurrent.futures', 'argparse', 'asyncio', 'json', 'sys', 'time',
+                          'anime_catalog', 'recommend', 'result_cache'],
+        'allowed-io': ['RecommendationServer.serve'],
+        'max-line-length': 120,
+    },
+}
+
+
+def check_modules() -> None:
+    """Run python_ta on every module in CHECKED_MODULES with its configuration."""
+    for module_name, config in CHECKED_MODULES.items():
+        python_ta.check_all(module_name, config=config)
+
+
+if __name__ == '__main__':
+    check_modules()
+
+    # Enabling python_ta configurations:
+    python_ta.check_all(config={
+        'extra-imports': ['python_ta'],
+        'allowed-io': [],
+        'max-line-length': 120,
+    })
@@ -0,0 +1,126 @@
+"""CSC111 Course Project: recommend.py
+
+Module description
+===============================
+
+This Python module is a command line interface to the recommendation system, which does not need (or import) PyQt,
+so that recommendations can be made in batch jobs or on servers. It takes the titles of the movies and shows the user
+has watched, the minimum rating, the genre whitelist and the number of recommendations as arguments or from a JSON
+file, and prints the recommended animes, from the best to the worst match, as JSON. For example:
+
+    python -m recommend "The Matrix" "Friends" --rating 7 --genre Action --num-rec 5
+
+The JSON file given with --query holds an object with any of the keys "titles", "rating", "genres" and "num_rec";
+arguments given on the command line take precedence over it.
+
+This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
+"""
+from __future__ import annotations
+from typing import Optional
+import argparse
+import json
+import os
+import sys
+
+import gui_snapshot
+import result_cache
+import scoring_engine
+from recommendation_algorithm import MediaBase
+
+# The number of recommendations made when none is asked for, as in the GUI.
+DEFAULT_NUM_REC = 3
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Return the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(prog='recommend', description='Recommend animes from the movies and shows you '
+                                                                   'have watched, printed as JSON.')
+    parser.add_argument('titles', nargs='*', help='titles of the movies and shows you have watched')
+    parser.add_argument('--query', metavar='FILE', help='JSON file holding any of "titles", "rating", "genres" and '
+                                                        '"num_rec"')
+    parser.add_argument('--rating', type=float, help='minimum rating of the recommended animes (default: 0)')
+    parser.add_argument('--genre', dest='genres', action='append', metavar='GENRE',
+                        help='genre every recommended anime must have (can be repeated)')
+    parser.add_argument('-k', '--num-rec', type=int, help=f'number of recommendations (default: {DEFAULT_NUM_REC})')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes scoring the catalog')
+    parser.add_argument('--no-cache', action='store_true', help='do not reuse or store results in the result cache')
+    return parser
+
+
+def read_query(args: argparse.Namespace) -> tuple[list[str], float, set[str], int]:
+    """Return the titles, minimum rating, genre whitelist and number of recommendations of the query, taken from
+    args and, for those not given there, from the JSON file args.query.
+    """
+    query = {}
+    if args.query is not None:
+        with open(args.query, 'r') as f:
+            query = json.load(f)
+    titles = args.titles or query.get('titles', [])
+    rating = args.rating if args.rating is not None else query.get('rating', 0.0)
+    genres = args.genres if args.genres is not None else query.get('genres', [])
+    num_rec = args.num_rec if args.num_rec is not None else query.get('num_rec', DEFAULT_NUM_REC)
+    return titles, float(rating), set(genres), int(num_rec)
+
+
+def find_entries(titles: list[str]) -> tuple[list[tuple[dict, str]], list[str]]:
+    """Return the input set (dataset entry, form) of the given titles, and the titles that are in neither filtered
+    IMDB dataset.
+
+    The records are located with the GUI snapshot if it is up to date, and otherwise by reading the datasets that
+    exist.
+    """
+    if gui_snapshot.is_up_to_date():
+        snapshot = gui_snapshot.load_gui_snapshot()
+        found = {title: (snapshot.entry(title), snapshot.titles[title]) for title in titles if title in snapshot.titles}
+    else:
+        title_entries = load_title_entries()
+        found = {title: title_entries[title] for title in titles if title in title_entries}
+    return [found[title] for title in dict.fromkeys(titles) if title in found], \
+        [title for title in titles if title not in found]
+
+
+def load_title_entries() -> dict[str, tuple[dict, str]]:
+    """Return a mapping from every title in the filtered IMDB datasets that exist to its dataset entry and form.
+    A title in both datasets is taken to be a show, as in the GUI.
+    """
+    title_entries = {}
+    for form, filename in gui_snapshot.MEDIA_FILES.items():
+        if os.path.exists(filename):
+            for title, _, entry in gui_snapshot.extract_records(filename):
+                title_entries[title] = (entry, form)
+    return title_entries
+
+
+def recommendations_to_json(recommendations: list[MediaBase]) -> list[dict]:
+    """Return the JSON objects describing the given recommendations, ranked in the given order."""
+    return [{'rank': rank, 'title': anime.title, 'score': anime.recommendation['score'][0], 'rating': anime.rating,
+             'date': anime.date, 'genres': sorted(anime.genres)}
+            for rank, anime in enumerate(recommendations, start=1)]
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the command line interface with the arguments argv (or those of this process) and return its exit status.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    titles, rating, genres, num_rec = read_query(args)
+    if not titles:
+        parser.error('no titles given')
+    elif num_rec < 0:
+        parser.error('the number of recommendations must not be negative')
+    input_set, unknown = find_entries(titles)
+    if unknown:
+        parser.error('unknown titles: ' + ', '.join(repr(title) for title in unknown))
+
+    if args.no_cache:
+        recommendations = scoring_engine.get_recommendations(input_set, num_rec, rating, genres, workers=args.workers)
+    else:
+        recommendations = result_cache.get_recommendations(input_set, num_rec, rating, genres,
+                                                           result_cache.ResultCache(), workers=args.workers)
+    json.dump(recommendations_to_json(recommendations), sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,45 +1,126 @@
 """Makes sure this file is only run after 'datasets/filtered/keyword_graph.txt' is made"""
 from __future__ import annotations
-from typing import Optional
+from typing import Iterable, Optional
+import ast
+import threading
 import json
+import os
 import numpy as np
 import graph_classes
 
+ANIME_FILE = 'datasets/filtered/final_animes.json'
+KEYWORD_GRAPH_FILE = 'datasets/filtered/keyword_graph.txt'
+# Binary snapshot of the keyword graph, written by keyword_graph_maker.write_graph_snapshot.
+KEYWORD_GRAPH_SNAPSHOT = 'datasets/filtered/keyword_graph.bin'
 
-class Media:
-    """The media class that contains metadata about a show/movie
+# Files written by distance_table_maker.py, holding the precomputed distances between every pair of keywords.
+DISTANCE_MATRIX_FILE = 'datasets/filtered/keyword_distances.npy'
+DISTANCE_VOCABULARY_FILE = 'datasets/filtered/keyword_distances.json'
+
+# The weights of the date, rating, genre and keyword assessments in Media.compare.
+# This should be subject to change (and tweaking will majorly affect results).
+COMPARISON_WEIGHTS = (0.07, 0.11, 0.28, 0.54)
+
+
+class Vocabulary:
+    """Interns strings to consecutive integer ids, so that they can be stored and compared as small integers.
+
+    Instance Attributes:
+        - ids: maps each interned string to its id
+        - names: the interned strings, ordered by their ids
+        - _lock: held while a new string is interned
+
+    Representation Invariants:
+        - all(self.names[self.ids[name]] == name for name in self.ids)
+        - len(self.names) == len(self.ids)
     """
-    title: str  # unique string denoting the media’s name of reference
-    type: str  # is either 'movie' or 'show'
-    genres: set[str]  # set of genres that apply to the media
-    rating: float  # from 0 to 10 inclusive, denotes the rating score
-    date: int  # the year of the media’s initial release
-    synopsis: str  # string of a brief summary, contains keywords to be extracted
-    keywords: set[str]  # set of words that describe the media.
-    recommendation: Optional[dict[str, tuple[float, set[Media]]]]
+    ids: dict[str, int]
+    names: list[str]
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        """Initialize an empty vocabulary."""
+        self.ids = {}
+        self.names = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of interned strings."""
+        return len(self.names)
+
+    def intern(self, name: str) -> int:
+        """Return the id of name, giving it the next free id if it has not been interned yet.
+        """
+        if name not in self.ids:
+            with self._lock:  # So that two threads interning the same new name agree on its id
+                if name not in self.ids:
+                    self.names.append(name)
+                    self.ids[name] = len(self.names) - 1
+        return self.ids[name]
 
-    def __init__(self, entry: dict, form: str) -> None:
+
+class GenreVocabulary(Vocabulary):
+    """A vocabulary of genres, whose ids are used as bit positions so that a set of genres can be stored as one
+    integer mask whose j-th bit is set exactly when the set contains the genre with id j.
+    """
+
+    def mask(self, genres: Iterable[str]) -> int:
+        """Return the mask of the given genres, interning any that are new.
+
+        >>> vocabulary = GenreVocabulary()
+        >>> vocabulary.mask(['Drama', 'Comedy'])
+        3
+        >>> vocabulary.mask({'Comedy'})
+        2
+        """
+        genre_mask = 0
+        for genre in genres:
+            genre_mask |= 1 << self.intern(genre)
+        return genre_mask
+
+    def lookup_mask(self, genres: Iterable[str]) -> Optional[int]:
+        """Return the mask of the given genres, or None if any of them has not been interned, in which case no mask
+        made by this vocabulary so far has it. Unlike mask, this never interns a genre, so it is the one to use on
+        genres given by users.
+
+        >>> vocabulary = GenreVocabulary()
+        >>> vocabulary.mask(['Drama', 'Comedy'])
+        3
+        >>> vocabulary.lookup_mask({'Comedy'})
+        2
+        >>> vocabulary.lookup_mask({'Comedy', 'Mecha'}) is None
+        True
+        >>> len(vocabulary)
+        2
         """
+        genre_mask = 0
+        for genre in genres:
+            if genre not in self.ids:
+                return None
+            genre_mask |= 1 << self.ids[genre]
+        return genre_mask
+
+    def genres_of(self, genre_mask: int) -> set[str]:
+        """Return the set of genres in genre_mask.
+
         Preconditions:
-        - The entry is a dictionary from a finalized json dataset that conforms with the naming scheme
-        - form is either 'TV' or 'movie' or 'anime'
+            - genre_mask < 1 << len(self)
         """
-        self.title = entry['title']
-        self.type = form
-        if isinstance(entry['genre'], str):
-            self.genres = set(entry['genre'].split(', '))
-        else:
-            self.genres = set(entry['genre'])
-        self.rating = float(entry['rating'])
-        if isinstance(entry['release_date'], int):
-            self.date = entry['release_date']
-        else:  # Otherwise 'release_date' is a string
-            str_to_float = float(entry['release_date'])
-            float_to_int = int(str_to_float)
-            self.date = float_to_int
-        self.synopsis = entry['plot_summary']
-        self.keywords = set(entry['keywords'])  # Originally, entry['keywords'] was a list
-        self.recommendation = {}
+        return {self.names[genre_id] for genre_id in range(len(self.names)) if genre_mask >> genre_id & 1}
+
+
+# The genre vocabulary shared by every Media, so that the genre masks of any two Media can be compared.
+GENRE_VOCABULARY = GenreVocabulary()
+
+# The vocabulary of the lower-cased keywords of every CompactMedia.
+KEYWORD_VOCABULARY = Vocabulary()
+
+
+class MediaBase:
+    """The assessments that compare a media, as a possible recommendation, to a media of the user's input set.
+    They are shared by Media and CompactMedia, which provide the attributes of a Media that the assessments read.
+    """
+    __slots__ = ()
 
     def __str__(self) -> str:
         """
@@ -48,23 +129,48 @@ class Media:
         return f"Media({self.title}, {self.type}, {self.genres}, " \
                f"{self.rating}, {self.date}, {self.synopsis}, {self.keywords}, {self.recommendation})"
 
-    def compare(self, other: Media, parent_set: set[Media], graph: graph_classes.Graph) -> float:
+    def compare(self, other: Media, parent_set: set[Media] | QueryProfile, graph: graph_classes.DistanceSource,
+                max_depth: Optional[int] = None) -> float:
         """compares itself to another media with 4 assessments,
         and mutates its recommendation accordingly
 
+        parent_set may be given as the QueryProfile of the input set, which should be done whenever many medias are
+        compared against the same input set, since the profile's statistics are then only computed once.
+        max_depth is passed on to keyword_comparison.
+
         Preconditions:
-        - other in parent_set
+        - other in parent_set (or other in parent_set.media, if parent_set is a QueryProfile)
         """
-        sim_scores = [0, 0, 0, 0]
-        mul = (0.07, 0.11, 0.28, 0.54)  # this should be subject to change (and tweaking will majorly affect results)
-        # 1. date comparison
-        sim_scores[0] = self.date_comparison(other, list(parent_set))
-        # 2. rating comparison
-        sim_scores[1] = self.rating_comparison(other, list(parent_set))
-        # 3. genre comparison
-        sim_scores[2] = self.genre_comparison(other)
+        if isinstance(parent_set, QueryProfile):
+            profile = parent_set
+        else:
+            profile = QueryProfile(parent_set)
+        # 1. - 3. date, rating and genre comparisons
+        sim_scores = self.cheap_comparisons(other, profile)
         # 4. keyword comparison
-        sim_scores[3] = self.keyword_comparison(other, graph)
+        sim_scores.append(self.keyword_comparison(other, graph, max_depth, profile))
+        return self.combine_comparisons(sim_scores)
+
+    def cheap_comparisons(self, other: Media, profile: QueryProfile) -> list[float]:
+        """Return the date, rating and genre comparison scores of itself and other, which are the three assessments
+        of compare that are cheap to compute.
+
+        Preconditions:
+        - other in profile.media
+        """
+        return [self.date_comparison(other, profile), self.rating_comparison(other, profile),
+                self.genre_comparison(other)]
+
+    def combine_comparisons(self, sim_scores: list[float]) -> float:
+        """Return the similarity score of compare, given the date, rating, genre and keyword comparison scores.
+
+        The result never decreases when any of sim_scores increases, so replacing the keyword comparison score by its
+        maximum of 1 gives an upper bound of the similarity score that can be found without comparing keywords.
+
+        Preconditions:
+        - len(sim_scores) == len(COMPARISON_WEIGHTS)
+        """
+        mul = COMPARISON_WEIGHTS
         # balancing comparison values
         # assert sum(sim_scores) <= 4  # 4 would be if it gets perfect scores in each # COMMENTED OUT BC IT FAILED
         # assert len(sim_scores) == len(mul)
@@ -72,31 +178,43 @@ class Media:
         act_score = sum(sim_scores[x] * mul[x] for x in range(0, len(sim_scores))) / perfect_score
         return min(act_score + (self.rating / 50), 1)
 
-    def keyword_comparison(self, other: Media, graph: graph_classes.Graph) -> float:
-        """compares two medias' keywords using a keyword graph"""
+    def keyword_comparison(self, other: Media, graph: graph_classes.DistanceSource,
+                           max_depth: Optional[int] = None, profile: Optional[QueryProfile] = None) -> float:
+        """compares two medias' keywords using a keyword graph
+
+        graph may also be a graph_classes.DistanceTable (see load_keyword_distance_table), in which case keyword
+        distances are looked up in the precomputed table rather than found by searching the graph, or a
+        graph_classes.LandmarkOracle, in which case they are estimated from landmark distances. Estimates are never
+        below the true distances, so the approximate scores can only be lower than the exact ones. Finally, graph may
+        be a graph_classes.HopBitsetIndex, which scores keywords with bitwise operations but, like max_depth, treats
+        keywords more than its max_hops edges apart as unrelated.
+
+        If max_depth is given, keyword pairs more than max_depth edges apart are treated as unrelated, just like
+        unconnected pairs. Such pairs would score at most 1 / (max_depth + 2) each, so a small cap loses little score
+        while sparing the graph searches through far-away parts of large components.
+
+        If a profile of an input set containing other is given, its lower-cased keywords of other are reused.
+        """
         true_path_scores = []
-        for anime_keyword in self.keywords:
-            anime_word = anime_keyword.lower()
-            paths = []
-            for other_keyword in other.keywords:
-                other_word = other_keyword.lower()
-                # the following two lines assert line is for testing only (so delete later)
-                # words = {x for x in graph._vertices}
-                # assert anime_word in words and other_word in words
-
-                path = graph.shortest_path(anime_word, other_word)
-                if path:
-                    paths.append(path[0])
-            if not paths:  # if all the shortest_path lengths were False, i.e. no words connected
+        anime_words = self.keyword_words
+        if profile is not None and other in profile.keywords:
+            other_words = profile.keywords[other]
+        else:
+            other_words = {other_keyword.lower() for other_keyword in other.keywords}
+        # One multi-source search gives, for every anime keyword, the distance to the closest of the other show's
+        # keywords, which is the only distance we need from each anime keyword.
+        distances = graph.nearest_distances(anime_words, other_words, max_depth)
+        for anime_word in anime_words:
+            if distances[anime_word] is None:  # i.e. no words connected
                 true_path_scores.append(0)
             else:
-                true_path_score = 1 / min(paths)  # one of these other shows's keywords relates to this keyword the best
-                true_path_scores.append(true_path_score)
+                # The closest keyword has a path of distance + 1 vertices, and relates to this keyword the best.
+                true_path_scores.append(1 / (distances[anime_word] + 1))
         while true_path_scores.count(0) >= 5 and any(x > 0 for x in true_path_scores):
             true_path_scores.remove(0)
         return sum(true_path_scores) / len(true_path_scores)
 
-    def rating_comparison(self, other: Media, list_of_media: list[Media]) -> float:
+    def rating_comparison(self, other: Media, list_of_media: list[Media] | QueryProfile) -> float:
         """
         This function first computes the IQR (Interquartile range) of the ratings of the input show list.
         Then, it checks if the ratings of the recommended show is within that IQR. If yes, then it is deemed to be
@@ -127,16 +245,19 @@ class Media:
         Arguments:
         self: Refers to the Media object of reference (the anime recommendation)
         other: Refers to comparison Media object (the user input media)
-        list_of_media: Refers to the list of input media objects
+        list_of_media: Refers to the list of input media objects, or to their QueryProfile
         """
+        if not isinstance(list_of_media, QueryProfile):
+            list_of_media = QueryProfile(list_of_media)
+
         # Step 3: Get mean rating from list of user-input shows (this is used for z score calculation)
-        mean_rating = calculating_mean_rating(list_of_media)
+        mean_rating = list_of_media.mean_rating
 
         # Step 3: Get IQR date range from list of user-input shows
-        iqr_of_ratings = calculating_iqr_of_ratings(list_of_media)
+        iqr_of_ratings = list_of_media.iqr_of_ratings
 
         # Step 4: Get the standard deviation and z score of the recommendation
-        standard_dev_of_ratings = calculating_s_d_ratings(list_of_media)
+        standard_dev_of_ratings = list_of_media.s_d_ratings
 
         # Handle for cases where standard_dev_of_ratings = 0
         if standard_dev_of_ratings == 0:
@@ -163,7 +284,7 @@ class Media:
             else:
                 return 0.5 + z_score_of_recommend
 
-    def date_comparison(self, other: Media, list_of_media: list[Media]) -> float:
+    def date_comparison(self, other: Media, list_of_media: list[Media] | QueryProfile) -> float:
         """
         This function first computes the IQR (Interquartile range) of the dates of the input show list.
         Then, it checks if the date of the recommended show is within that IQR. If yes, then it is deemed to be
@@ -190,17 +311,19 @@ class Media:
         Arguments:
         self: Refers to the Media object of reference (the anime recommendation)
         other: Refers to comparison Media object (the user input media)
-        list_of_media: Refers to the list of input media objects
+        list_of_media: Refers to the list of input media objects, or to their QueryProfile
         """
+        if not isinstance(list_of_media, QueryProfile):
+            list_of_media = QueryProfile(list_of_media)
 
         # Step 1: Get mean date from list of user-input shows (this is used for z score calculation)
-        mean_date = calculating_mean_date(list_of_media)
+        mean_date = list_of_media.mean_date
 
         # Step 2: Get IQR date range from list of user-input shows
-        iqr_of_dates = calculating_iqr_of_dates(list_of_media)
+        iqr_of_dates = list_of_media.iqr_of_dates
 
         # Step 3: Get the standard deviation and z score of the recommendation
-        standard_dev_of_dates = calculating_s_d_dates(list_of_media)
+        standard_dev_of_dates = list_of_media.s_d_dates
 
         # Step 4: If standard deviation = 0 (when all entries in list_of_media are same), date score is based on...
         # ... the date distance from input shows and recommended show
@@ -225,10 +348,234 @@ class Media:
         """
         Compute the fraction of shared genres between itself (a Media object) and another Media object
         """
-        num_genre_shared = len(self.genres.intersection(other.genres))
+        num_genre_shared = (self.genre_mask & other.genre_mask).bit_count()
         return num_genre_shared / len(other.genres)
 
 
+class Media(MediaBase):
+    """The media class that contains metadata about a show/movie
+    """
+    title: str  # unique string denoting the media’s name of reference
+    type: str  # is either 'movie' or 'show'
+    genres: set[str]  # set of genres that apply to the media
+    genre_mask: int  # GENRE_VOCABULARY.mask(genres)
+    rating: float  # from 0 to 10 inclusive, denotes the rating score
+    date: int  # the year of the media’s initial release
+    synopsis: str  # string of a brief summary, contains keywords to be extracted
+    keywords: set[str]  # set of words that describe the media.
+    keyword_words: list[str]  # the keywords, lower-cased once here rather than in every keyword_comparison
+    recommendation: Optional[dict[str, tuple[float, set[Media]]]]
+
+    def __init__(self, entry: dict, form: str) -> None:
+        """
+        Preconditions:
+        - The entry is a dictionary from a finalized json dataset that conforms with the naming scheme
+        - form is either 'TV' or 'movie' or 'anime'
+        """
+        self.title = entry['title']
+        self.type = form
+        self.genres = _entry_genres(entry)
+        self.genre_mask = GENRE_VOCABULARY.mask(self.genres)
+        self.rating = float(entry['rating'])
+        self.date = _entry_date(entry)
+        self.synopsis = entry['plot_summary']
+        self.keywords = set(entry['keywords'])  # Originally, entry['keywords'] was a list
+        self.keyword_words = [keyword.lower() for keyword in self.keywords]
+        self.recommendation = {}
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore a pickled Media. Genre masks are only meaningful within the process whose GENRE_VOCABULARY made
+        them, so the genres are interned again, which lets Media be passed between processes.
+        """
+        self.__dict__.update(state)
+        self.genre_mask = GENRE_VOCABULARY.mask(self.genres)
+
+
+class CompactMedia(MediaBase):
+    """A Media that takes far less memory, used for the animes of the catalog, which are kept in memory from query
+    to query (see anime_catalog.py).
+
+    It keeps its attributes in slots rather than an instance dictionary, its genres as a genre mask and its keywords
+    as ids in KEYWORD_VOCABULARY, lower-cased once when it is made. Its synopsis is left in a list of synopses shared
+    by the whole catalog until it is needed. The genres, keywords, keyword_words and synopsis attributes of Media are
+    available as properties.
+
+    Instance Attributes:
+        - title, type, rating, date, genre_mask, recommendation: as in Media
+        - keyword_ids: the ids in KEYWORD_VOCABULARY of the lower-cased keywords, in the order of keyword_words
+        - _synopses: the list of synopses that holds this media's synopsis
+        - _synopsis_index: the index of this media's synopsis in self._synopses
+
+    Representation Invariants:
+        - 0 <= self._synopsis_index < len(self._synopses)
+    """
+    __slots__ = ('title', 'type', 'rating', 'date', 'genre_mask', 'keyword_ids', 'recommendation', '_synopses',
+                 '_synopsis_index')
+    title: str
+    type: str
+    rating: float
+    date: int
+    genre_mask: int
+    keyword_ids: tuple[int, ...]
+    recommendation: Optional[dict[str, tuple[float, set[Media]]]]
+    _synopses: list[str]
+    _synopsis_index: int
+
+    def __init__(self, entry: dict, form: str, synopses: Optional[list[str]] = None) -> None:
+        """Initialize the media of entry, as Media(entry, form) does. Its synopsis is appended to synopses, or kept
+        on its own if synopses is None.
+
+        Preconditions:
+        - The entry is a dictionary from a finalized json dataset that conforms with the naming scheme
+        - form is either 'TV' or 'movie' or 'anime'
+        """
+        self.title = entry['title']
+        self.type = form
+        self.genre_mask = GENRE_VOCABULARY.mask(_entry_genres(entry))
+        self.rating = float(entry['rating'])
+        self.date = _entry_date(entry)
+        # Made from a set of the keywords, like Media.keyword_words, so both list the keywords in the same order.
+        self.keyword_ids = tuple(KEYWORD_VOCABULARY.intern(keyword.lower()) for keyword in set(entry['keywords']))
+        self.recommendation = None
+        self._synopses = [] if synopses is None else synopses
+        self._synopses.append(entry['plot_summary'])
+        self._synopsis_index = len(self._synopses) - 1
+
+    def __getstate__(self) -> dict:
+        """Return the state of this media to be pickled, with its genres, keywords and synopsis spelled out, since
+        ids are only meaningful within the process whose vocabularies made them.
+        """
+        return {'title': self.title, 'type': self.type, 'rating': self.rating, 'date': self.date,
+                'genres': sorted(self.genres), 'keyword_words': self.keyword_words, 'synopsis': self.synopsis,
+                'recommendation': self.recommendation}
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore a media pickled with the state returned by __getstate__, interning its genres and keywords in the
+        vocabularies of this process.
+        """
+        self.title = state['title']
+        self.type = state['type']
+        self.rating = state['rating']
+        self.date = state['date']
+        self.genre_mask = GENRE_VOCABULARY.mask(state['genres'])
+        self.keyword_ids = tuple(KEYWORD_VOCABULARY.intern(word) for word in state['keyword_words'])
+        self.recommendation = state['recommendation']
+        self._synopses = [state['synopsis']]
+        self._synopsis_index = 0
+
+    def __copy__(self) -> CompactMedia:
+        """Return a copy of this media that holds its own synopsis, so that the copy does not keep the synopses of
+        the whole catalog alive after the catalog is released.
+        """
+        media = CompactMedia.__new__(CompactMedia)
+        for attribute in ('title', 'type', 'rating', 'date', 'genre_mask', 'keyword_ids', 'recommendation'):
+            setattr(media, attribute, getattr(self, attribute))
+        media._synopses = [self.synopsis]
+        media._synopsis_index = 0
+        return media
+
+    @property
+    def genres(self) -> set[str]:
+        """The set of genres that apply to the media."""
+        return GENRE_VOCABULARY.genres_of(self.genre_mask)
+
+    @property
+    def keyword_words(self) -> list[str]:
+        """The lower-cased keywords of the media."""
+        names = KEYWORD_VOCABULARY.names
+        return [names[keyword_id] for keyword_id in self.keyword_ids]
+
+    @property
+    def keywords(self) -> set[str]:
+        """The set of (lower-cased) words that describe the media."""
+        return set(self.keyword_words)
+
+    @property
+    def synopsis(self) -> str:
+        """The brief summary of the media."""
+        return self._synopses[self._synopsis_index]
+
+
+def _entry_genres(entry: dict) -> set[str]:
+    """Return the set of genres of the dataset entry, whose genres are either a list or a comma separated string.
+    """
+    if isinstance(entry['genre'], str):
+        return set(entry['genre'].split(', '))
+    else:
+        return set(entry['genre'])
+
+
+def _entry_date(entry: dict) -> int:
+    """Return the release year of the dataset entry.
+    """
+    if isinstance(entry['release_date'], int):
+        return entry['release_date']
+    else:  # Otherwise 'release_date' is a string
+        str_to_float = float(entry['release_date'])
+        float_to_int = int(str_to_float)
+        return float_to_int
+
+
+class QueryProfile:
+    """Everything about a user's input set that the assessments of Media.compare need, computed once per query
+    rather than once per comparison.
+
+    Instance Attributes:
+        - media: the input media objects
+        - mean_date: the mean release year of the input set (see calculating_mean_date)
+        - s_d_dates: the standard deviation of the release years of the input set
+        - iqr_of_dates: the first and third quartiles of the release years of the input set
+        - mean_rating: the mean rating of the input set
+        - s_d_ratings: the standard deviation of the ratings of the input set
+        - iqr_of_ratings: the first and third quartiles of the ratings of the input set
+        - keywords: maps each input media to its lower-cased keywords
+        - keyword_ids: maps each input media to the vertex ids of its lower-cased keywords in the keyword graph the
+          profile was made for (empty if it was not made for a graph_classes.CompactGraph); keywords that are not in
+          the graph are left out
+        - genres: maps each input media to its genres
+        - genre_masks: maps each input media to its genre mask (see GenreVocabulary)
+
+    Representation Invariants:
+        - self.media != []
+        - all(item in self.keywords and item in self.genres and item in self.genre_masks for item in self.media)
+    """
+    media: list[Media]
+    mean_date: int
+    s_d_dates: float
+    iqr_of_dates: tuple[int, int]
+    mean_rating: float
+    s_d_ratings: float
+    iqr_of_ratings: tuple[float, float]
+    keywords: dict[Media, frozenset[str]]
+    keyword_ids: dict[Media, list[int]]
+    genres: dict[Media, frozenset[str]]
+    genre_masks: dict[Media, int]
+
+    def __init__(self, input_media: Iterable[Media], graph: Optional[graph_classes.DistanceSource] = None) -> None:
+        """Initialize the profile of input_media. If graph is a graph_classes.CompactGraph, the input keywords are
+        also looked up in it.
+
+        Preconditions:
+            - input_media is not empty
+        """
+        self.media = list(input_media)
+        self.mean_date = calculating_mean_date(self.media)
+        self.s_d_dates = calculating_s_d_dates(self.media)
+        self.iqr_of_dates = calculating_iqr_of_dates(self.media)
+        self.mean_rating = calculating_mean_rating(self.media)
+        self.s_d_ratings = calculating_s_d_ratings(self.media)
+        self.iqr_of_ratings = calculating_iqr_of_ratings(self.media)
+
+        self.keywords = {item: frozenset(item.keyword_words) for item in self.media}
+        self.genres = {item: frozenset(item.genres) for item in self.media}
+        self.genre_masks = {item: item.genre_mask for item in self.media}
+        self.keyword_ids = {}
+        if isinstance(graph, graph_classes.CompactGraph):
+            for item in self.media:
+                vertex_ids = (graph.vertex_id(keyword) for keyword in self.keywords[item])
+                self.keyword_ids[item] = sorted(vertex_id for vertex_id in vertex_ids if vertex_id is not None)
+
+
 def calculating_mean_rating(user_input_media: list[Media]) -> float:
     """
     Calculates the mean show rating of a user input media list
@@ -285,19 +632,45 @@ def calculating_iqr_of_dates(user_input_media: list[Media]) -> tuple[int, int]:
     return (int(q1), int(q3))
 
 
-def build_keyword_graph_from_file() -> graph_classes.Graph:
-    """makes the graph to be used in the keywords assessment"""
-    with open('datasets/filtered/keyword_graph.txt', 'r') as f:
+def build_keyword_graph_from_file(compact: bool = False, keyword_file: Optional[str] = None) \
+        -> graph_classes.Graph | graph_classes.CompactGraph:
+    """makes the graph to be used in the keywords assessment
+
+    If compact is True, the keywords are stored in an array-backed graph_classes.CompactGraph instead of a
+    graph_classes.Graph. Both support every graph method used by Media. The compact graph is memory-mapped from
+    KEYWORD_GRAPH_SNAPSHOT when that snapshot is at least as new as KEYWORD_GRAPH_FILE, which skips parsing the
+    text file entirely.
+
+    If keyword_file is given, the graph is always parsed from that text file instead of KEYWORD_GRAPH_FILE (this is
+    how keyword_graph_maker.write_graph_snapshot makes the snapshot).
+    """
+    if keyword_file is None:
+        if compact and os.path.exists(KEYWORD_GRAPH_SNAPSHOT) and \
+                os.path.getmtime(KEYWORD_GRAPH_SNAPSHOT) >= os.path.getmtime(KEYWORD_GRAPH_FILE):
+            return graph_classes.CompactGraph.from_snapshot(KEYWORD_GRAPH_SNAPSHOT)
+        keyword_file = KEYWORD_GRAPH_FILE
+
+    with open(keyword_file, 'r') as f:
         lines = f.readlines()
-    keyword_graph = graph_classes.Graph()
-    edges = eval(lines[1])
-    vertices = eval(lines[0])
+    if compact:
+        keyword_graph = graph_classes.CompactGraph()
+    else:
+        keyword_graph = graph_classes.Graph()
+    edges = ast.literal_eval(lines[1])
+    vertices = ast.literal_eval(lines[0])
     for vertex in vertices:
         keyword_graph.add_vertex(vertex)
     keyword_graph.add_all_edges(edges)
     return keyword_graph
 
 
+def load_keyword_distance_table() -> graph_classes.DistanceTable:
+    """loads the keyword distance table written by distance_table_maker.py, to be used in place of the keyword
+    graph in the keywords assessment. The table is memory-mapped, so loading it is almost instant.
+    """
+    return graph_classes.DistanceTable.load(DISTANCE_MATRIX_FILE, DISTANCE_VOCABULARY_FILE)
+
+
 # IMPORTANT: PLEASE READ HERE:
 # If you want to test out our recommendation algorithm (on one user entry and comparing to only a subset of all...
 # ... animes found on final_animes.json), you can run method test_compare() in the console.
@@ -324,10 +697,11 @@ def test_compare() -> None:
         else:
             input_list.append(Media(x, 'show'))
 
+    input_profile = QueryProfile(input_list, keyword_graph)
     for anime in anime_list[0:41]:
         rec_score = 0
         for item in input_list:
-            sim_score = anime.compare(item, set(input_list), keyword_graph)
+            sim_score = anime.compare(item, input_profile, keyword_graph)
             rec_score += sim_score
         rec_score /= len(input_list)
         rec_list.append((rec_score, anime.title))
@@ -346,9 +720,9 @@ if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ["json", "numpy", "graph_classes"],
+        'extra-imports': ["ast", "threading", "json", "os", "numpy", "graph_classes"],
         'allowed-io': ["build_keyword_graph_from_file", "test_compare"],
-        'disable': ['R0902', "W0123"],
+        'disable': ['R0902'],
         # Disable instance attribute count as confirmed with instructor that this number is acceptable
         'max-line-length': 120,
     })
@@ -0,0 +1,310 @@
+"""CSC111 Course Project: recommendation_server.py
+
+Module description
+===============================
+
+This Python module serves recommendations to other tools over HTTP on localhost, using only the standard library.
+The server is long-lived, so the anime catalog, the keyword graph and its keyword pair cache (see anime_catalog.py)
+are loaded once and stay warm from request to request, and results are reused through the result cache.
+
+Endpoints:
+    - POST /recommend: the body is a JSON object with "titles" (a list of watched movie and show titles) and
+      optionally "rating", "genres" and "num_rec", as in recommend.py. The response is the ranked recommendations.
+    - GET /health: whether the server is up and its catalog is loaded.
+    - GET /metrics: counters of the requests served, how many were coalesced and the state of the caches.
+    - POST /reload: start reloading the catalog and keyword graph from their files in the background (see
+      anime_catalog.CatalogHolder). Queries keep being answered from the current catalog until the new one is ready.
+      The files are also reloaded without this whenever a query finds that they have changed.
+
+Scoring is CPU-bound, so it runs in an executor thread rather than on the event loop, which keeps answering health
+and metrics requests meanwhile. Identical queries that arrive while one is being scored wait for that one's result
+instead of scoring the catalog again. For example:
+
+    python recommendation_server.py --port 8111
+    curl -d '{"titles": ["The Matrix"], "num_rec": 5}' http://127.0.0.1:8111/recommend
+
+This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
+"""
+from __future__ import annotations
+from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import anime_catalog
+import recommend
+import result_cache
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8111
+
+# The greatest size in bytes of a request body that is read.
+MAX_BODY_SIZE = 1 << 20
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+            500: 'Internal Server Error'}
+
+
+class RequestError(Exception):
+    """Raised when a request cannot be served, with the HTTP status of the response and a message for the client.
+
+    Instance Attributes:
+        - status: the HTTP status code of the response
+    """
+    status: int
+
+    def __init__(self, status: int, message: str) -> None:
+        """Initialize an error answered with the given status and message."""
+        super().__init__(message)
+        self.status = status
+
+
+class RecommendationServer:
+    """A localhost HTTP server of recommendations, which keeps the anime catalog and the caches warm between requests.
+
+    Instance Attributes:
+        - title_entries: maps every title that can be asked for to its dataset entry and form
+        - cache: the cache of past results
+        - workers: the number of processes scoring the catalog (see scoring_engine.get_recommendations)
+        - counters: the number of requests served, failed, coalesced and computed, and the total time spent computing
+        - started: the time.monotonic() time at which the server was made
+        - _executor: the thread that scoring runs in, so that the event loop is never blocked by it
+        - _in_flight: maps the fingerprint of every query being scored to the future of its result
+
+    Representation Invariants:
+        - self.workers >= 1
+    """
+    title_entries: dict[str, tuple[dict, str]]
+    cache: result_cache.ResultCache
+    workers: int
+    counters: dict[str, float]
+    started: float
+    _executor: ThreadPoolExecutor
+    _in_flight: dict[str, asyncio.Future]
+
+    def __init__(self, cache: result_cache.ResultCache, workers: int = 1) -> None:
+        """Initialize a server that reuses the results in cache and scores with the given number of processes.
+
+        Preconditions:
+            - workers >= 1
+        """
+        self.title_entries = recommend.load_title_entries()
+        self.cache = cache
+        self.workers = workers
+        self.counters = {'requests': 0, 'errors': 0, 'recommendations': 0, 'coalesced': 0, 'computed': 0,
+                         'compute_seconds': 0.0}
+        self.started = time.monotonic()
+        # One thread: Python threads would only contend for the interpreter, and scoring in parallel is done by the
+        # worker processes of scoring_engine instead.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scoring')
+        self._in_flight = {}
+
+    async def warm_up(self) -> None:
+        """Load the anime catalog and keyword graph in the executor, so that the first request does not wait for them.
+        """
+        await asyncio.get_running_loop().run_in_executor(self._executor, anime_catalog.get_catalog)
+
+    async def recommend(self, query: Any) -> list[dict]:
+        """Return the recommendations for the query (a JSON object as described in this module's docstring), as
+        recommend.recommendations_to_json does.
+
+        If the same query is already being scored, its result is awaited instead of scoring the catalog again.
+        Raise RequestError if the query is malformed or holds unknown titles.
+        """
+        titles, rating, genres, num_rec = parse_query(query)
+        unknown = [title for title in titles if title not in self.title_entries]
+        if unknown:
+            raise RequestError(400, 'unknown titles: ' + ', '.join(repr(title) for title in unknown))
+        input_set = [self.title_entries[title] for title in dict.fromkeys(titles)]
+
+        catalog = anime_catalog.SHARED_CATALOG.peek()
+        if catalog is None:  # Only before warm_up has loaded it
+            await self.warm_up()
+            catalog = anime_catalog.SHARED_CATALOG.peek()
+        # Keyed on the digests of the loaded catalog, as hashing the dataset files again would block the event loop.
+        key = result_cache.fingerprint(input_set, num_rec, rating, genres, catalog.digests)
+        if key in self._in_flight:
+            self.counters['coalesced'] += 1
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self._compute, input_set, num_rec, rating, genres)
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded, so that a client hanging up does not cancel the scoring other clients are waiting for.
+        recommendations = await asyncio.shield(self._in_flight[key])
+        self.counters['recommendations'] += 1
+        return recommendations
+
+    def _compute(self, input_set: list[tuple[dict, str]], num_rec: int, rating: float, genres: set[str]) \
+            -> list[dict]:
+        """Return the JSON recommendations of the query. This runs in the executor."""
+        start = time.perf_counter()
+        recommendations = result_cache.get_recommendations(input_set, num_rec, rating, genres, self.cache,
+                                                           workers=self.workers)
+        self.counters['computed'] += 1
+        self.counters['compute_seconds'] += time.perf_counter() - start
+        return recommend.recommendations_to_json(recommendations)
+
+    def health(self) -> dict:
+        """Return the JSON object answered to /health."""
+        return {'status': 'ok', 'catalog_loaded': anime_catalog.SHARED_CATALOG.peek() is not None}
+
+    def metrics(self) -> dict:
+        """Return the JSON object answered to /metrics."""
+        catalog = anime_catalog.SHARED_CATALOG.peek()
+        pair_cache = None if catalog is None else catalog.graph.pair_cache
+        computed = self.counters['computed']
+        return {
+            'uptime_seconds': round(time.monotonic() - self.started, 3),
+            'requests': self.counters['requests'],
+            'errors': self.counters['errors'],
+            'recommendations': self.counters['recommendations'],
+            'coalesced': self.counters['coalesced'],
+            'computed': computed,
+            'mean_compute_ms': round(self.counters['compute_seconds'] / computed * 1e3, 3) if computed else None,
+            'in_flight': len(self._in_flight),
+            'result_cache': {'hits': self.cache.hits, 'misses': self.cache.misses},
+            'keyword_pair_cache': None if pair_cache is None else {
+                'size': len(pair_cache), 'hits': pair_cache.hits, 'misses': pair_cache.misses,
+                'hit_rate': round(pair_cache.hit_rate(), 4)},
+            'catalog_size': None if catalog is None else len(catalog),
+            'catalog_reloads': anime_catalog.SHARED_CATALOG.reloads,
+            'catalog_reloading': anime_catalog.SHARED_CATALOG.is_reloading(),
+            'catalog_reload_error': None if anime_catalog.SHARED_CATALOG.last_error is None
+            else repr(anime_catalog.SHARED_CATALOG.last_error),
+        }
+
+    async def route(self, method: str, path: str, body: bytes) -> Any:
+        """Return the JSON response to a request for path with the given method and body.
+        Raise RequestError if it cannot be served.
+        """
+        endpoints = {'/recommend': 'POST', '/health': 'GET', '/metrics': 'GET', '/reload': 'POST'}
+        path = path.split('?', 1)[0]
+        if path not in endpoints:
+            raise RequestError(404, f'no endpoint {path}')
+        elif method != endpoints[path]:
+            raise RequestError(405, f'{path} only accepts {endpoints[path]}')
+        elif path == '/health':
+            return self.health()
+        elif path == '/metrics':
+            return self.metrics()
+        elif path == '/reload':
+            anime_catalog.SHARED_CATALOG.reload()
+            return {'reloading': True}
+        try:
+            query = json.loads(body)
+        except ValueError:
+            raise RequestError(400, 'the body is not valid JSON') from None
+        return await self.recommend(query)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one HTTP request on the connection of reader and writer, then close it."""
+        self.counters['requests'] += 1
+        try:
+            method, path, body = await _read_request(reader)
+            status, response = 200, await self.route(method, path, body)
+        except RequestError as error:
+            self.counters['errors'] += 1
+            status, response = error.status, {'error': str(error)}
+        except Exception as error:  # Reported to the client rather than killing the connection silently
+            self.counters['errors'] += 1
+            status, response = 500, {'error': repr(error)}
+        try:
+            writer.write(_response(status, response))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        """Load the catalog, then serve requests on host and port until cancelled."""
+        await self.warm_up()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            print(f'Serving recommendations on http://{host}:{port}')
+            await server.serve_forever()
+
+
+def parse_query(query: Any) -> tuple[list[str], float, set[str], int]:
+    """Return the titles, minimum rating, genre whitelist and number of recommendations of a /recommend query.
+    Raise RequestError if the query is malformed.
+    """
+    if not isinstance(query, dict):
+        raise RequestError(400, 'the query must be a JSON object')
+    titles = query.get('titles')
+    genres = query.get('genres', [])
+    rating = query.get('rating', 0.0)
+    num_rec = query.get('num_rec', recommend.DEFAULT_NUM_REC)
+    if not isinstance(titles, list) or titles == [] or not all(isinstance(title, str) for title in titles):
+        raise RequestError(400, '"titles" must be a non-empty list of strings')
+    elif not isinstance(genres, list) or not all(isinstance(genre, str) for genre in genres):
+        raise RequestError(400, '"genres" must be a list of strings')
+    elif isinstance(rating, bool) or not isinstance(rating, (int, float)):
+        raise RequestError(400, '"rating" must be a number')
+    elif isinstance(num_rec, bool) or not isinstance(num_rec, int) or num_rec < 0:
+        raise RequestError(400, '"num_rec" must be a non-negative integer')
+    return titles, float(rating), set(genres), num_rec
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    """Return the method, path and body of the HTTP request read from reader.
+    Raise RequestError if it is malformed or its body is too large.
+    """
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        raise RequestError(400, 'malformed request') from None
+    lines = head.decode('latin-1').split('\r\n')
+    request_line = lines[0].split()
+    if len(request_line) != 3:
+        raise RequestError(400, 'malformed request line')
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        raise RequestError(400, 'malformed Content-Length') from None
+    if length < 0:
+        raise RequestError(400, 'malformed Content-Length')
+    elif length > MAX_BODY_SIZE:
+        raise RequestError(413, f'the body is larger than {MAX_BODY_SIZE} bytes')
+    try:
+        body = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise RequestError(400, 'the body is shorter than its Content-Length') from None
+    return request_line[0], request_line[1], body
+
+
+def _response(status: int, response: Any) -> bytes:
+    """Return the HTTP response with the given status whose body is response as JSON."""
+    body = json.dumps(response).encode('utf-8')
+    head = (f'HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n')
+    return head.encode('latin-1') + body
+
+
+def main() -> int:
+    """Run the server with the options given on the command line until it is interrupted, and return its exit status.
+    """
+    parser = argparse.ArgumentParser(description='Serve recommendations over HTTP on localhost.')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes scoring the catalog')
+    args = parser.parse_args()
+    server = RecommendationServer(result_cache.ResultCache(), args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
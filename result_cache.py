@@ -0,0 +1,238 @@
+"""CSC111 Course Project: result_cache.py
+
+Module description
+===============================
+
+This Python module is responsible for remembering the recommendations made for past queries on disk, so that
+resubmitting the same watched list with the same filters returns its recommendations right away instead of scoring
+the anime catalog again.
+
+Each query is identified by a fingerprint: a SHA-256 hash of the whole dataset entries of its input media, its
+number of recommendations, minimum rating and genre whitelist, together with hashes of the contents of the anime
+dataset, the keyword graph file and its binary snapshot (see anime_catalog.current_digests). Editing any of these
+files therefore changes every fingerprint, and regenerating an IMDB dataset (for example with
+keyword_graph_maker.update_dataset_keywords) changes the fingerprint of every query using its changed entries, so
+recommendations made from the old data are never returned again. The cache keeps a bounded number of results,
+evicting the least recently used one when it is full.
+
+This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
+"""
+from __future__ import annotations
+from typing import Callable, Optional
+import hashlib
+import json
+import os
+import pickle
+
+import anime_catalog
+import recommendation_algorithm
+import scoring_engine
+from recommendation_algorithm import Media
+
+RESULT_CACHE_DIRECTORY = 'datasets/cache/recommendations'
+
+# Bump this whenever a change to the recommendation code changes its results, so that old results are not reused.
+RESULT_CACHE_VERSION = 1
+
+
+class ResultCache:
+    """A cache of recommendations stored on disk, one pickle file per query fingerprint, which evicts the least
+    recently used result once it holds more than capacity results. The modification time of each file records when
+    it was last used.
+
+    Instance Attributes:
+        - directory: the directory holding the cached results
+        - capacity: the greatest number of results kept
+        - hits: the number of lookups (by this object) that found their result
+        - misses: the number of lookups (by this object) that did not
+
+    Representation Invariants:
+        - self.capacity > 0
+
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> cache = ResultCache(directory, capacity=2)
+    >>> cache.put('a', [])
+    >>> cache.put('b', [])
+    >>> for name, last_used in [('a', 1), ('b', 2)]:  # So that a is the least recently used
+    ...     os.utime(os.path.join(directory, name + '.pickle'), (last_used, last_used))
+    >>> cache.get('a')  # And now b is
+    []
+    >>> cache.put('c', [])
+    >>> sorted(os.listdir(directory))
+    ['a.pickle', 'c.pickle']
+    >>> cache.get('b') is None, cache.hits, cache.misses
+    (True, 1, 1)
+    """
+    directory: str
+    capacity: int
+    hits: int
+    misses: int
+
+    def __init__(self, directory: str = RESULT_CACHE_DIRECTORY, capacity: int = 256) -> None:
+        """Initialize a cache of at most capacity results stored in directory, which is created when the first
+        result is stored. Results already in directory are kept.
+
+        Preconditions:
+            - capacity > 0
+        """
+        self.directory = directory
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """Return the number of results in the cache."""
+        return len(self._result_files())
+
+    def get(self, fingerprint: str) -> Optional[list[Media]]:
+        """Return the recommendations stored under fingerprint, or None if there are none.
+        """
+        filename = self._filename(fingerprint)
+        try:
+            with open(filename, 'rb') as f:
+                recommendations = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError):  # A damaged file is treated as missing
+            self.misses += 1
+            self._remove(filename)
+            return None
+        os.utime(filename)
+        self.hits += 1
+        return recommendations
+
+    def put(self, fingerprint: str, recommendations: list[Media]) -> None:
+        """Store recommendations under fingerprint, then evict the least recently used results over capacity.
+
+        The file is written under a temporary name and then moved into place, so that other processes sharing the
+        directory never read a partly written result.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        filename = self._filename(fingerprint)
+        temporary_file = f'{filename}.{os.getpid()}.tmp'
+        with open(temporary_file, 'wb') as f:
+            pickle.dump(recommendations, f)
+        os.replace(temporary_file, filename)
+
+        result_files = self._result_files()
+        if len(result_files) > self.capacity:
+            result_files.sort(key=_modification_time)
+            for old_file in result_files[:len(result_files) - self.capacity]:
+                self._remove(old_file)
+
+    def clear(self) -> None:
+        """Remove every result from the cache.
+        """
+        for filename in self._result_files():
+            self._remove(filename)
+
+    def _filename(self, fingerprint: str) -> str:
+        """Return the name of the file storing the result with the given fingerprint."""
+        return os.path.join(self.directory, fingerprint + '.pickle')
+
+    def _result_files(self) -> list[str]:
+        """Return the names of the files storing the results in the cache."""
+        if not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.pickle')]
+
+    def _remove(self, filename: str) -> None:
+        """Remove the given result file, if another process has not already done so."""
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+
+def _modification_time(filename: str) -> float:
+    """Return the modification time of filename, or 0.0 if it no longer exists."""
+    try:
+        return os.path.getmtime(filename)
+    except FileNotFoundError:
+        return 0.0
+
+
+def fingerprint(input_set: list[tuple[dict, str]], num_rec: int, rating: float, genres: set[str],
+                digests: Optional[dict[str, Optional[str]]] = None) -> str:
+    """Return the fingerprint of a query for recommendations (see scoring_engine.get_recommendations) answered from
+    the dataset files with the given digests (see anime_catalog.current_digests), or from the current files if
+    digests is None.
+
+    The fingerprint does not depend on the order of the input media or of the whitelisted genres. It changes whenever
+    the anime dataset, the keyword graph file or its snapshot changes, and whenever any field of an input entry
+    changes, as scoring reads their ratings, genres, dates and keywords and not only their titles.
+
+    >>> digests = {recommendation_algorithm.ANIME_FILE: 'a', recommendation_algorithm.KEYWORD_GRAPH_FILE: 'k',
+    ...            recommendation_algorithm.KEYWORD_GRAPH_SNAPSHOT: None}
+    >>> friends = {'title': 'Friends', 'rating': 8.9, 'genre': 'Comedy, Romance'}
+    >>> matrix = {'title': 'The Matrix', 'rating': 8.7, 'genre': 'Action, Sci-Fi'}
+    >>> query = fingerprint([(friends, 'Show'), (matrix, 'Movie')], 3, 7, {'Action', 'Comedy'}, digests)
+    >>> query == fingerprint([(matrix, 'Movie'), (friends, 'Show')], 3, 7.0, {'Comedy', 'Action'}, digests)
+    True
+    >>> query == fingerprint([(friends, 'Show'), (dict(matrix, rating=8.8), 'Movie')], 3, 7, {'Action', 'Comedy'},
+    ...                      digests)
+    False
+    >>> query == fingerprint([(friends, 'Show'), (matrix, 'Movie')], 3, 7, {'Action', 'Comedy'},
+    ...                      dict(digests, **{recommendation_algorithm.KEYWORD_GRAPH_FILE: 'k2'}))
+    False
+    >>> query == fingerprint([(friends, 'Show'), (matrix, 'Movie')], 3, 7, {'Action', 'Comedy'},
+    ...                      dict(digests, **{recommendation_algorithm.KEYWORD_GRAPH_SNAPSHOT: 's'}))
+    False
+    """
+    if digests is None:
+        digests = anime_catalog.current_digests()
+    query = {
+        'version': RESULT_CACHE_VERSION,
+        'inputs': sorted([json.dumps(entry, sort_keys=True), form] for entry, form in input_set),
+        'num_rec': num_rec,
+        'rating': float(rating),
+        'genres': sorted(genres),
+        'weights': list(recommendation_algorithm.COMPARISON_WEIGHTS),
+        'animes': digests[recommendation_algorithm.ANIME_FILE],
+        'keyword_graph': digests[recommendation_algorithm.KEYWORD_GRAPH_FILE],
+        'keyword_graph_snapshot': digests[recommendation_algorithm.KEYWORD_GRAPH_SNAPSHOT],
+    }
+    return hashlib.sha256(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_recommendations(input_set: list[tuple[dict, str]], num_rec: int, rating: float, genres: set[str],
+                        cache: ResultCache, workers: int = 1, progress: Optional[scoring_engine.ProgressHook] = None,
+                        cancelled: Optional[Callable[[], bool]] = None) -> list[Media]:
+    """Return scoring_engine.get_recommendations(input_set, num_rec, rating, genres, workers=workers,
+    progress=progress, cancelled=cancelled), reusing the result stored in cache for the same query if there is one,
+    and storing the result otherwise. A cancelled query stores nothing.
+
+    The query is scored against the shared catalog and keyed on the files that catalog was loaded from, so a result
+    computed from the old files while a reload is under way is never stored as a result for the new ones.
+
+    Preconditions:
+        - input_set != []
+        - every dict in the input_set is a valid entry format (json entry, form)
+    """
+    catalog = anime_catalog.get_catalog()
+    query_fingerprint = fingerprint(input_set, num_rec, rating, genres, catalog.digests)
+    recommendations = cache.get(query_fingerprint)
+    if recommendations is None:
+        recommendations = scoring_engine.get_recommendations(input_set, num_rec, rating, genres, workers=workers,
+                                                             catalog=catalog, progress=progress, cancelled=cancelled)
+        cache.put(query_fingerprint, recommendations)
+    return recommendations
+
+
+if __name__ == '__main__':
+    # Enabling doctest checking features:
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    # Enabling python_ta configurations:
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'hashlib', 'json', 'os', 'pickle', 'anime_catalog', 'recommendation_algorithm',
+                          'scoring_engine'],
+        'allowed-io': ['ResultCache.get', 'ResultCache.put'],
+        'max-line-length': 120,
+    })
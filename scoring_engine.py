@@ -0,0 +1,617 @@
+"""CSC111 Course Project: scoring_engine.py
+
+Module description
+===============================
+
+This Python module is responsible for scoring the whole anime catalog against a user's input set at once.
+Instead of building a Media object per anime and calling Media.compare for every input item, it stores the catalog as
+numpy columns (ratings, release dates, genres and keyword ids) and computes each of the four assessments of
+Media.compare for every anime with a few array expressions. The scores are the same as those of the per-object
+recommendation code.
+
+It also holds the recommendation pipeline used by the GUI, which streams the animes through Media.compare one at a
+time and keeps only the best num_rec of them in a bounded heap (see top_k), so that memory stays proportional to the
+number of recommendations rather than to the size of the catalog. The catalog can also be split into chunks that
+are scored in parallel by a pool of worker processes.
+
+This file is Copyright (c) 2023 Jaron Fernandes, Ethan Fine, Carmen Chau, Jaiz Jeeson
+"""
+from __future__ import annotations
+from typing import Any, Callable, Iterable, Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import functools
+import heapq
+import json
+import math
+import multiprocessing
+
+import numpy as np
+
+import anime_catalog
+import graph_classes
+import recommendation_algorithm
+from recommendation_algorithm import Media, MediaBase, QueryProfile
+
+# The number of chunks the catalog is split into per worker process when scoring in parallel. Several chunks per
+# worker keep every worker busy even when some chunks have far more candidates that pass the filters than others.
+CHUNKS_PER_WORKER = 4
+
+# The number of candidates scored between two checks of the cancelled hook and two calls of the progress hook of
+# get_recommendations.
+PROGRESS_INTERVAL = 32
+
+# The type of the progress hook of get_recommendations. It is called with the amount of work done, the total amount
+# of work, and the best (score, anime) pairs found so far, from the best to the worst.
+ProgressHook = Callable[[int, int, list[tuple[float, MediaBase]]], None]
+
+
+class ScoringCancelled(Exception):
+    """Raised by get_recommendations when its cancelled hook returns True before it is done."""
+
+
+class CatalogColumns:
+    """The anime catalog stored column by column.
+
+    Instance Attributes:
+        - media: the Media object of every anime, in catalog order
+        - ratings: the rating of every anime
+        - dates: the release year of every anime
+        - genres: a boolean matrix where entry [i, j] is whether the i-th anime has the genre with id j in
+          recommendation_algorithm.GENRE_VOCABULARY (see genre_matrix)
+        - keyword_ids: a matrix where row i holds the keyword graph vertex ids of the (lower-cased) keywords of the
+          i-th anime, padded with -1; keywords that are not in the graph are also -1
+        - keyword_counts: the number of keywords of every anime
+
+    Representation Invariants:
+        - len(self.media) == len(self.ratings) == len(self.dates) == len(self.keyword_counts)
+        - self.genres.shape[0] == len(self.media)
+        - self.keyword_ids.shape[0] == len(self.media)
+    """
+    media: list[Media]
+    ratings: np.ndarray
+    dates: np.ndarray
+    genres: np.ndarray
+    keyword_ids: np.ndarray
+    keyword_counts: np.ndarray
+
+    def __init__(self, media: list[Media], graph: graph_classes.CompactGraph) -> None:
+        """Initialize the columns of the catalog of the given animes, looking their keywords up in graph.
+        """
+        self.media = media
+        self.ratings = np.array([anime.rating for anime in media], dtype=np.float64)
+        self.dates = np.array([anime.date for anime in media], dtype=np.int64)
+
+        self.genres = genre_matrix([anime.genre_mask for anime in media],
+                                   len(recommendation_algorithm.GENRE_VOCABULARY))
+
+        self.keyword_counts = np.array([len(anime.keywords) for anime in media], dtype=np.int64)
+        self.keyword_ids = np.full((len(media), max(self.keyword_counts, default=0)), -1, dtype=np.int64)
+        for i, anime in enumerate(media):
+            for j, keyword in enumerate(anime.keywords):
+                vertex_id = graph.vertex_id(keyword.lower())
+                if vertex_id is not None:
+                    self.keyword_ids[i, j] = vertex_id
+
+    def __len__(self) -> int:
+        """Return the number of animes in the catalog."""
+        return len(self.media)
+
+    def whitelisted(self, min_rating: float, genres: set[str]) -> np.ndarray:
+        """Return a boolean array of which animes in the catalog are rated at least min_rating and have every genre
+        in genres.
+        """
+        whitelist_mask = recommendation_algorithm.GENRE_VOCABULARY.lookup_mask(genres)
+        # Some whitelisted genre is not the genre of any anime if either holds
+        if whitelist_mask is None or whitelist_mask >> self.genres.shape[1]:
+            return np.zeros(len(self), dtype=bool)
+        required = genre_matrix([whitelist_mask], self.genres.shape[1])[0]
+        return (self.ratings >= min_rating) & self.genres[:, required].all(axis=1)
+
+
+def genre_matrix(genre_masks: list[int], num_genres: int) -> np.ndarray:
+    """Return a boolean matrix where entry [i, j] is whether bit j of genre_masks[i] is set, for the first
+    num_genres bits.
+
+    >>> genre_matrix([5, 2], 3)
+    array([[ True, False,  True],
+           [False,  True, False]])
+    """
+    matrix = np.zeros((len(genre_masks), num_genres), dtype=bool)
+    for i, genre_mask in enumerate(genre_masks):
+        matrix[i] = [genre_mask >> genre_id & 1 for genre_id in range(num_genres)]
+    return matrix
+
+
+def score_catalog(catalog: CatalogColumns, profile: QueryProfile, graph: graph_classes.CompactGraph,
+                  max_depth: Optional[int] = None) -> np.ndarray:
+    """Return the recommendation score of every anime in catalog for the user's input set, given by its profile, in
+    catalog order.
+
+    The score of an anime is the average of Media.compare between the anime and each input item, as computed by
+    the per-object recommendation code, but every anime is scored at once for each input item.
+
+    Preconditions:
+        - all(count > 0 for count in catalog.keyword_counts)
+    """
+    weights = recommendation_algorithm.COMPARISON_WEIGHTS
+    perfect_score = 4 * sum(weights)
+    rec_scores = np.zeros(len(catalog), dtype=np.float64)
+    overlaps = genre_overlaps(catalog, profile)
+    for j, item in enumerate(profile.media):
+        act_score = (date_scores(catalog, item, profile) * weights[0]
+                     + rating_scores(catalog, item, profile) * weights[1]
+                     + overlaps[:, j] / len(item.genres) * weights[2]
+                     + keyword_scores(catalog, item, graph, max_depth, profile) * weights[3]) / perfect_score
+        rec_scores += np.minimum(act_score + catalog.ratings / 50, 1)
+    return rec_scores / len(profile.media)
+
+
+def rank_catalog(catalog: CatalogColumns, profile: QueryProfile, graph: graph_classes.CompactGraph,
+                 max_depth: Optional[int] = None) -> np.ndarray:
+    """Return the indices of the animes in catalog ordered from the highest to the lowest recommendation score
+    (see score_catalog). Animes with equal scores keep their catalog order.
+    """
+    scores = score_catalog(catalog, profile, graph, max_depth)
+    return np.argsort(-scores, kind='stable')
+
+
+def date_scores(catalog: CatalogColumns, other: Media, profile: QueryProfile) -> np.ndarray:
+    """Return Media.date_comparison(other, profile) for every anime in catalog.
+    """
+    mean_date = profile.mean_date
+    iqr_of_dates = profile.iqr_of_dates
+    standard_dev_of_dates = profile.s_d_dates
+
+    with np.errstate(divide='ignore'):
+        if standard_dev_of_dates == 0:
+            date_difference = np.abs(catalog.dates - other.date)
+            return np.where(date_difference == 0, 1.0, 1 / date_difference)
+        else:
+            abs_z_score = np.abs((catalog.dates - mean_date) / standard_dev_of_dates)
+            in_iqr = (catalog.dates >= iqr_of_dates[0]) & (catalog.dates < iqr_of_dates[1])
+            return np.where(in_iqr | (abs_z_score < 1), 1.0, 1 / abs_z_score)
+
+
+def rating_scores(catalog: CatalogColumns, other: Media, profile: QueryProfile) -> np.ndarray:
+    """Return Media.rating_comparison(other, profile) for every anime in catalog.
+    """
+    mean_rating = profile.mean_rating
+    iqr_of_ratings = profile.iqr_of_ratings
+    standard_dev_of_ratings = profile.s_d_ratings
+
+    if standard_dev_of_ratings == 0:
+        return np.where(catalog.ratings - other.rating >= 0, 1.0, 0.0)
+    else:
+        z_score = (catalog.ratings - mean_rating) / standard_dev_of_ratings
+        in_iqr = (catalog.ratings >= iqr_of_ratings[0]) & (catalog.ratings <= iqr_of_ratings[1])
+        return np.select([in_iqr, z_score < 0.0, z_score == 0.0, 0.5 + z_score > 1.0],
+                         [1.0, 0.0, 0.5, 1.0], 0.5 + z_score)
+
+
+def genre_scores(catalog: CatalogColumns, other: Media) -> np.ndarray:
+    """Return Media.genre_comparison(other) for every anime in catalog.
+    """
+    other_genres = genre_matrix([other.genre_mask], catalog.genres.shape[1])[0]
+    return np.count_nonzero(catalog.genres & other_genres, axis=1) / len(other.genres)
+
+
+def genre_overlaps(catalog: CatalogColumns, profile: QueryProfile) -> np.ndarray:
+    """Return the matrix whose entry [i, j] is the number of genres shared by the i-th anime in catalog and the
+    j-th item of profile.media, computed for the whole query with one matrix product.
+    """
+    # Genres interned after the catalog was built (e.g. of input movies) belong to no anime, so they can be ignored.
+    input_genres = genre_matrix([profile.genre_masks[item] for item in profile.media], catalog.genres.shape[1])
+    return catalog.genres.astype(np.int64) @ input_genres.T.astype(np.int64)
+
+
+def keyword_scores(catalog: CatalogColumns, other: Media, graph: graph_classes.CompactGraph,
+                   max_depth: Optional[int] = None, profile: Optional[QueryProfile] = None) -> np.ndarray:
+    """Return Media.keyword_comparison(other, graph, max_depth) for every anime in catalog.
+
+    One vectorised search (CompactGraph.distances_to_ids) gives the distance from every keyword to the nearest
+    keyword of other, and each anime's keyword scores are then read off with one indexing operation. If profile was
+    made for graph, the vertex ids of other's keywords are taken from it instead of being looked up again.
+    """
+    unreachable = graph_classes.DistanceTable.UNREACHABLE
+    if profile is not None and other in profile.keyword_ids:
+        distances = graph.distances_to_ids(profile.keyword_ids[other], max_depth)
+    else:
+        distances = graph.distances_to_set({keyword.lower() for keyword in other.keywords}, max_depth)
+    # Index -1 (padding, or keywords missing from the graph) reads the UNREACHABLE appended at the end.
+    distances = np.append(distances, np.uint8(unreachable))[catalog.keyword_ids]
+    connected = distances != unreachable
+    path_scores = np.where(connected, 1 / (distances.astype(np.float64) + 1), 0.0)
+
+    # Media.keyword_comparison drops unconnected keywords until only 4 are left, as long as some keyword is connected.
+    num_connected = connected.sum(axis=1)
+    num_unconnected = catalog.keyword_counts - num_connected
+    num_kept = np.where((num_connected > 0) & (num_unconnected >= 5), num_connected + 4, catalog.keyword_counts)
+    return path_scores.sum(axis=1) / num_kept
+
+
+def top_k(candidates: Iterable[tuple[float, Any]], k: int) -> list[tuple[float, Any]]:
+    """Return the k (score, item) pairs of candidates with the highest scores, from the highest to the lowest score.
+    Pairs with equal scores keep the order in which candidates produced them.
+
+    Only k pairs are kept at any time, in a min-heap whose root is the worst of them, so selecting from n candidates
+    takes O(n log k) time and O(k) memory.
+
+    >>> top_k([(0.5, 'a'), (0.9, 'b'), (0.1, 'c'), (0.9, 'd')], 3)
+    [(0.9, 'b'), (0.9, 'd'), (0.5, 'a')]
+    """
+    if k <= 0:
+        return []
+    # Keys are (score, -position), so a later candidate only displaces an earlier one with a strictly higher score,
+    # and the items themselves are never compared.
+    heap = []
+    for position, (score, item) in enumerate(candidates):
+        entry = (score, -position, item)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    heap.sort(key=lambda heap_entry: heap_entry[:2], reverse=True)
+    return [(score, item) for score, _, item in heap]
+
+
+class KeywordIndex:
+    """An inverted index from keywords to the animes whose keywords lie within a few hops of them in the keyword
+    graph, used to generate the candidates for a query without going through the whole catalog.
+
+    Instance Attributes:
+        - entries: the anime entries that were indexed, in catalog order
+        - max_hops: the greatest number of edges between a keyword and the keywords of the animes it is mapped to
+        - postings: maps each keyword of the graph to the sorted positions in self.entries of the animes with a
+          (lower-cased) keyword at most self.max_hops edges from it; keywords with no such anime are left out
+        - fallback: the positions of the highest rated animes, which are always candidates, so that queries with
+          few or no related animes still get recommendations
+
+    Representation Invariants:
+        - self.max_hops >= 0
+        - all(0 <= position < len(self.entries) for positions in self.postings.values() for position in positions)
+        - all(0 <= position < len(self.entries) for position in self.fallback)
+    """
+    entries: list[dict]
+    max_hops: int
+    postings: dict[str, list[int]]
+    fallback: list[int]
+
+    def __init__(self, entries: list[dict], graph: graph_classes.Graph | graph_classes.CompactGraph,
+                 max_hops: int = 3, fallback_size: int = 100) -> None:
+        """Index the anime entries by the keywords of graph within max_hops edges of their keywords, keeping the
+        fallback_size highest rated animes as the fallback pool.
+        """
+        self.entries = entries
+        self.max_hops = max_hops
+        postings = {}
+        neighbourhoods = {}  # Anime keywords are shared by many animes, so each one is only searched from once
+        for position, entry in enumerate(entries):
+            for keyword in {anime_keyword.lower() for anime_keyword in entry['keywords']}:
+                if keyword not in neighbourhoods:
+                    neighbourhoods[keyword] = graph.distances_from(keyword, max_hops)
+                for nearby_keyword in neighbourhoods[keyword]:
+                    postings.setdefault(nearby_keyword, set()).add(position)
+        self.postings = {keyword: sorted(positions) for keyword, positions in postings.items()}
+
+        by_rating = sorted(range(len(entries)), key=lambda i: float(entries[i]['rating']), reverse=True)
+        self.fallback = sorted(by_rating[:fallback_size])
+
+    def candidates(self, profile: QueryProfile) -> list[int]:
+        """Return the sorted positions in self.entries of the animes with a keyword within self.max_hops edges of a
+        keyword of the input set of profile, together with the fallback pool.
+        """
+        positions = set(self.fallback)
+        for keywords in profile.keywords.values():
+            for keyword in keywords:
+                positions.update(self.postings.get(keyword, []))
+        return sorted(positions)
+
+
+def load_anime_entries() -> list[dict]:
+    """Return the entries of recommendation_algorithm.ANIME_FILE.
+    """
+    with open(recommendation_algorithm.ANIME_FILE, 'r') as file:
+        return json.load(file)
+
+
+def filter_candidates(anime_entries: Iterable[dict], min_rating: float, genres: set[str]) -> Iterator[Media]:
+    """Yield the Media of every anime in anime_entries that is rated at least min_rating and has every genre in
+    genres.
+
+    Each Media is only made when its entry is reached, so the animes that are not kept by the consumer can be freed
+    right away.
+    """
+    whitelist_mask = recommendation_algorithm.GENRE_VOCABULARY.lookup_mask(genres)
+    for entry in anime_entries:
+        anime = Media(entry, 'anime')
+        if whitelist_mask is None:  # Some whitelisted genre may have been interned by the animes made since
+            whitelist_mask = recommendation_algorithm.GENRE_VOCABULARY.lookup_mask(genres)
+        if whitelist_mask is not None and anime.rating >= min_rating \
+                and anime.genre_mask & whitelist_mask == whitelist_mask:
+            yield anime
+
+
+def score_candidates(candidates: Iterable[Media], profile: QueryProfile, graph: graph_classes.DistanceSource,
+                     max_depth: Optional[int] = None) -> Iterator[tuple[float, Media]]:
+    """Yield the recommendation score and Media of every anime in candidates, for the input set of profile.
+    """
+    for anime in candidates:
+        rec_score = sum(anime.compare(item, profile, graph, max_depth) for item in profile.media)
+        yield rec_score / len(profile.media), anime
+
+
+def pruned_top_k(candidates: Iterable[Media], profile: QueryProfile, graph: graph_classes.DistanceSource, k: int,
+                 max_depth: Optional[int] = None, progress: Optional[ProgressHook] = None,
+                 cancelled: Optional[Callable[[], bool]] = None) -> list[tuple[float, Media]]:
+    """Return top_k(score_candidates(candidates, profile, graph, max_depth), k), comparing the keywords of as few
+    candidates as possible.
+
+    Process:
+        - Compute the cheap date, rating and genre comparisons of every candidate and an upper bound of each of its
+        keyword comparisons (see _keyword_bound), and with them an upper bound of its recommendation score.
+        - Score the candidates fully from the highest to the lowest bound, keeping the best k in a heap as top_k does.
+        - Stop once a bound cannot beat the worst of the k kept candidates, since no candidate left can then enter them.
+
+    The bounds are computed with the same floating point operations as the scores, so the result is exactly that of
+    exhaustive scoring, ties included. Unlike top_k, this keeps every candidate in memory.
+
+    While candidates are scored, progress (if given) is called every PROGRESS_INTERVAL candidates with the number of
+    candidates scored, the number of candidates and the best k pairs so far, and once more with the result. The
+    candidates left when scoring stops early are counted as done then. ScoringCancelled is raised as soon as
+    cancelled (if given) returns True.
+    """
+    if k <= 0:
+        return []
+    target_components = {}
+    if isinstance(graph, (graph_classes.Graph, graph_classes.CompactGraph)):
+        for item in profile.media:
+            target_components[item] = {graph.component(keyword) for keyword in profile.keywords[item]} - {None}
+
+    bounded = []
+    for position, anime in enumerate(candidates):
+        if position % PROGRESS_INTERVAL == 0:
+            _check_cancelled(cancelled)
+        cheap_scores = [anime.cheap_comparisons(item, profile) for item in profile.media]
+        bound = sum(anime.combine_comparisons(scores + [_keyword_bound(anime, item, profile, graph, target_components,
+                                                                       max_depth)])
+                    for item, scores in zip(profile.media, cheap_scores)) / len(profile.media)
+        bounded.append((bound, -position, anime, cheap_scores))
+    bounded.sort(key=lambda entry: entry[:2], reverse=True)
+
+    heap = []
+    for num_scored, (bound, negative_position, anime, cheap_scores) in enumerate(bounded):
+        if len(heap) == k and (bound, negative_position) <= heap[0][:2]:
+            break
+        if num_scored % PROGRESS_INTERVAL == 0:
+            _check_cancelled(cancelled)
+            if progress is not None and num_scored > 0:
+                progress(num_scored, len(bounded), _best_first(heap))
+        rec_score = sum(anime.combine_comparisons(scores + [anime.keyword_comparison(item, graph, max_depth, profile)])
+                        for item, scores in zip(profile.media, cheap_scores))
+        entry = (rec_score / len(profile.media), negative_position, anime)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    best = _best_first(heap)
+    if progress is not None:
+        progress(len(bounded), len(bounded), best)
+    return best
+
+
+def _best_first(heap: list[tuple[float, int, Media]]) -> list[tuple[float, Media]]:
+    """Return the (score, anime) pairs of the heap of pruned_top_k, from the best to the worst, without changing it.
+    """
+    return [(score, anime) for score, _, anime in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
+
+
+def _check_cancelled(cancelled: Optional[Callable[[], bool]]) -> None:
+    """Raise ScoringCancelled if cancelled is given and returns True."""
+    if cancelled is not None and cancelled():
+        raise ScoringCancelled
+
+
+def _keyword_bound(anime: Media, other: Media, profile: QueryProfile, graph: graph_classes.DistanceSource,
+                   target_components: dict[Media, set], max_depth: Optional[int] = None) -> float:
+    """Return an upper bound of anime.keyword_comparison(other, graph, max_depth, profile), found from connected
+    components alone, where target_components maps other to the components of its keywords in graph. If other is not
+    in target_components (graph has no components), return 1, the greatest possible keyword comparison score.
+
+    A keyword of anime scores 1 if it is a keyword of other, at most 1 / 2 if it is in the same component as one of
+    them, and 0 otherwise. Without max_depth, the keywords in those components are exactly the ones that score above
+    0, which also fixes how many unconnected keywords keyword_comparison drops. With max_depth, fewer keywords might
+    be reached, so only the smallest number of keywords that keyword_comparison can average over is assumed.
+    """
+    if other not in target_components:
+        return 1.0
+    targets, components = profile.keywords[other], target_components[other]
+    path_bounds = []
+    for anime_word in anime.keyword_words:
+        component = graph.component(anime_word)
+        if component is not None and anime_word in targets:
+            path_bounds.append(1.0)
+        elif component is not None and component in components:
+            path_bounds.append(0.5)
+        else:
+            path_bounds.append(0.0)
+    # Summed in the same order as in keyword_comparison, so the rounding can not make the bound too low.
+    total = sum(path_bounds)
+    num_connected = len(path_bounds) - path_bounds.count(0.0)
+    if num_connected == 0:
+        return 0.0
+    elif max_depth is not None:
+        return total / min(len(path_bounds), 5)
+    elif len(path_bounds) - num_connected >= 5:
+        return total / (num_connected + 4)
+    else:
+        return total / len(path_bounds)
+
+
+def rank_candidates(candidates: Iterable[Media], profile: QueryProfile, graph: graph_classes.DistanceSource, k: int,
+                    max_depth: Optional[int] = None, prune: bool = True, progress: Optional[ProgressHook] = None,
+                    cancelled: Optional[Callable[[], bool]] = None) -> list[tuple[float, Media]]:
+    """Return the k (score, anime) pairs of candidates with the highest recommendation scores for the input set of
+    profile, from the highest to the lowest score, using pruned_top_k if prune is True and top_k otherwise.
+
+    progress and cancelled are used as in pruned_top_k, except that top_k has no best pairs to report until it is
+    done, so without pruning progress is only called with the result.
+    """
+    if prune:
+        return pruned_top_k(candidates, profile, graph, k, max_depth, progress, cancelled)
+    if progress is not None:  # Only counted when progress needs the number of candidates
+        candidates = list(candidates)
+    scored = score_candidates(candidates, profile, graph, max_depth)
+    if cancelled is not None:
+        scored = _cancellable(scored, cancelled)
+    best = top_k(scored, k)
+    if progress is not None:
+        progress(len(candidates), len(candidates), best)
+    return best
+
+
+def _cancellable(items: Iterable[Any], cancelled: Callable[[], bool]) -> Iterator[Any]:
+    """Yield the items, raising ScoringCancelled once cancelled returns True (checked every PROGRESS_INTERVAL items).
+    """
+    for position, item in enumerate(items):
+        if position % PROGRESS_INTERVAL == 0:
+            _check_cancelled(cancelled)
+        yield item
+
+
+def _init_scoring_worker() -> None:
+    """Load the anime catalog of a worker process of a scoring pool when it starts, so that it is loaded once per
+    worker rather than once per chunk (see anime_catalog.get_catalog).
+    """
+    anime_catalog.get_catalog()
+
+
+def _score_chunk(input_set: list[tuple[dict, str]], start: int, stop: int, k: int, rating: float, genres: set[str],
+                 max_depth: Optional[int], prune: bool) -> list[tuple[float, Media]]:
+    """Return the best k (score, anime) pairs among the animes of the catalog at positions start to stop (exclusive)
+    that are rated at least rating and have every genre in genres, as rank_candidates does. This runs in a worker
+    process.
+    """
+    catalog = anime_catalog.get_catalog()
+    profile = QueryProfile([Media(entry, form) for entry, form in input_set], catalog.graph)
+    candidates = catalog.filtered(rating, genres, start, stop)
+    return rank_candidates(candidates, profile, catalog.graph, k, max_depth, prune)
+
+
+@functools.lru_cache(maxsize=None)
+def _scoring_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the pool of worker processes used by _parallel_top_k, starting it on the first call.
+    """
+    # Forked workers start without importing the main module again (main.py opens the GUI when it is imported) and
+    # inherit anything the parent has already loaded.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = None
+    return ProcessPoolExecutor(workers, mp_context=context, initializer=_init_scoring_worker)
+
+
+def _parallel_top_k(input_set: list[tuple[dict, str]], k: int, rating: float, genres: set[str],
+                    max_depth: Optional[int], prune: bool, workers: int, progress: Optional[ProgressHook] = None,
+                    cancelled: Optional[Callable[[], bool]] = None) -> list[tuple[float, MediaBase]]:
+    """Return the best k (score, anime) pairs of the whole catalog, as rank_candidates does, by scoring contiguous
+    chunks of the catalog in a pool of worker processes.
+
+    Each chunk's pairs come back best-first, and equal scores keep catalog order within a chunk. So merging the
+    chunks in catalog order with top_k, which keeps the earlier of equal scores, gives exactly the pairs found by
+    scoring the catalog in one go.
+
+    As each chunk is merged, progress (if given) is called with the number of animes of the catalog in the chunks
+    merged so far, the size of the catalog and the best k pairs of those chunks. If cancelled (if given) returns True
+    between two chunks, the chunks that have not started are cancelled and ScoringCancelled is raised.
+    """
+    num_animes = len(anime_catalog.get_catalog())
+    chunk_size = max(1, math.ceil(num_animes / (workers * CHUNKS_PER_WORKER)))
+    pool = _scoring_pool(workers)
+    chunks = [pool.submit(_score_chunk, input_set, start, start + chunk_size, k, rating, genres, max_depth, prune)
+              for start in range(0, num_animes, chunk_size)]
+    best = []
+    for i, chunk in enumerate(chunks):
+        if cancelled is not None and cancelled():
+            for pending_chunk in chunks[i:]:
+                pending_chunk.cancel()
+            raise ScoringCancelled
+        best = top_k(best + chunk.result(), k)
+        if progress is not None:
+            progress(min((i + 1) * chunk_size, num_animes), num_animes, best)
+    return best
+
+
+def get_recommendations(input_set: list[tuple[dict, str]], num_rec: int, rating: float, genres: set[str],
+                        graph: Optional[graph_classes.DistanceSource] = None,
+                        max_depth: Optional[int] = None, prune: bool = True,
+                        keyword_index: Optional[KeywordIndex] = None, workers: int = 1,
+                        catalog: Optional[anime_catalog.AnimeCatalog] = None, progress: Optional[ProgressHook] = None,
+                        cancelled: Optional[Callable[[], bool]] = None) -> list[MediaBase]:
+    """Return the num_rec animes (or all of them, if there are fewer) that are rated at least rating, have every
+    genre in genres and best match the input set, from the best to the worst match. Each anime's recommendation
+    score is stored in its recommendation attribute under 'score'. The animes returned are copies, so the catalog
+    shared by every query in this process is never changed.
+
+    The animes are taken from catalog, or if it is not given, from that shared catalog (see
+    anime_catalog.get_catalog), which is loaded on the first query and reloaded whenever the dataset files change.
+    graph is the keyword graph to compare keywords with. If it is not given,
+    the compact keyword graph of the catalog is used, along with its keyword pair cache.
+    If prune is True, candidates that cannot be among the best num_rec animes are found without comparing their
+    keywords (see pruned_top_k). This gives the same recommendations, but holds every candidate in memory instead
+    of streaming them through top_k.
+
+    If keyword_index is given, only the animes it generates as candidates for the input set (see
+    KeywordIndex.candidates) are scored, which makes the work of a query grow with the number of related animes
+    rather than with the size of the catalog. Animes whose keywords are all far from the input keywords are then
+    skipped, so the recommendations may differ from those found by scoring the whole catalog.
+
+    If workers is greater than 1, the catalog is scored in parallel by a pool of that many worker processes, which
+    is started on the first such call and kept for later ones (see _parallel_top_k). The recommendations are the
+    same as those found in this process. Every worker uses its own shared catalog (catalog is not used) and keyword
+    graph, so a ValueError is raised if graph or keyword_index is also given.
+
+    progress and cancelled let a caller on another thread follow and stop the query. progress is called from time to
+    time with the amount of work done, the total amount of work and the best (score, anime) pairs found so far, whose
+    animes belong to the catalog and must not be changed (see pruned_top_k and _parallel_top_k). cancelled is called
+    as often, and once it returns True, ScoringCancelled is raised.
+
+    Preconditions:
+        - input_set != []
+        - every dict in the input_set is a valid entry format (json entry, form)
+    """
+    input_media = [Media(entry, form) for entry, form in input_set]
+    if workers > 1:
+        if graph is not None or keyword_index is not None:
+            raise ValueError
+        best = _parallel_top_k(input_set, num_rec, rating, genres, max_depth, prune, workers, progress, cancelled)
+    else:
+        if catalog is None:
+            catalog = anime_catalog.get_catalog()
+        if graph is None:
+            graph = catalog.graph
+        profile = QueryProfile(input_media, graph)
+        if keyword_index is None:
+            candidates = catalog.filtered(rating, genres)
+        else:
+            anime_entries = [keyword_index.entries[position] for position in keyword_index.candidates(profile)]
+            candidates = filter_candidates(anime_entries, rating, genres)
+        best = rank_candidates(candidates, profile, graph, num_rec, max_depth, prune, progress, cancelled)
+    recommendations = []
+    for rec_score, anime in best:
+        recommendation = copy.copy(anime)
+        recommendation.recommendation = {'score': (rec_score, set(input_media))}
+        recommendations.append(recommendation)
+    return recommendations
+
+
+if __name__ == '__main__':
+    # Enabling python_ta configurations:
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'concurrent.futures', 'copy', 'functools', 'heapq', 'json', 'math',
+                          'multiprocessing', 'numpy', 'anime_catalog', 'graph_classes', 'recommendation_algorithm'],
+        'allowed-io': ['load_anime_entries'],
+        'max-line-length': 120,
+    })